@@ -1,24 +1,46 @@
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import pygame
+from camera import Camera
+from components import Node, default_canvas
+from gl_backend import DisplayListCache
+from skinning import SkinnedRenderer
+from culling import BoundingHierarchy, Frustum, transform_bounds
+import numpy as np
 
-class RobotView:
-    def __init__(self):
-        # 初始化視角參數
-        self.view_x = 0.0
-        self.view_y = 0.0
-        self.view_z = -15.0
-        self.view_rot_x = 0.0
-        self.view_rot_y = 0.0
+class RobotView(Camera):
+    def __init__(self, aspect=1.0, present=pygame.display.flip):
+        super().__init__(aspect)
+        # 畫完後呼叫（視窗模式為 pygame.display.flip，離屏渲染時為 None）
+        self.present = present
+        # profiler.FrameProfiler，開啟時才分段計時；hud 為 profiler.ProfilerHUD
+        self.profiler = None
+        self.hud = None
+        self.viewport_height = 1000
+        # 不跨越 Joint 的子樹編譯成 display list，關節轉動時不必重新編譯
+        self.display_lists = DisplayListCache()
+        # 開啟時改用著色器一次畫完整台機器人（skinning.py）
+        self.skinning = False
+        self.skinned = SkinnedRenderer()
+        # 視錐剔除；cull_stats 為最近一幀測試與繪製的節點數
+        self.culling = True
+        self.cull_stats = {}
+        self._hierarchy = None
+        # 建立時不呼叫 OpenGL（可能還沒有 context），第一次繪製時才設定
+        self.gl_ready = False
 
+    def setup_gl(self):
         # OpenGL視角設置
         glMatrixMode(GL_PROJECTION)
-        gluPerspective(45, 1, 0.1, 50.0)
+        gluPerspective(self.fov, self.aspect, self.near, self.far)
         glMatrixMode(GL_MODELVIEW)
         glTranslatef(0.0, 0.0, -5)
         glEnable(GL_DEPTH_TEST)
+        self.gl_ready = True
 
-    def render(self, robot):
+    def apply_camera(self):
+        if not self.gl_ready:
+            self.setup_gl()
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
         
@@ -26,8 +48,89 @@ class RobotView:
         glTranslatef(self.view_x, self.view_y, self.view_z)
         glRotatef(self.view_rot_x, 1, 0, 0)
         glRotatef(self.view_rot_y, 0, 1, 0)
+
+    def render(self, robot):
+        profiler = self.profiler
+        if profiler is not None and profiler.enabled:
+            self._render_profiled(robot, profiler)
+            return
+
+        self.apply_camera()
         
-        # 渲染機器人
-        robot.body.render()
+        # 渲染機器人：每個靜態子樹載入世界矩陣後呼叫 display list
+        if not (self.skinning and self.skinned.render(robot.kinematics)):
+            self.display_lists.render(robot.kinematics, default_canvas(), self.cull(robot.kinematics))
         
-        pygame.display.flip() 
\ No newline at end of file
+        if self.present is not None:
+            self.present()
+
+    def cull(self, kinematics):
+        """回傳每個節點是否在視錐內，關閉剔除時回傳 None"""
+        if not self.culling:
+            return None
+        if self._hierarchy is None or self._hierarchy.kinematics is not kinematics:
+            self._hierarchy = BoundingHierarchy(kinematics)
+        draw = self._hierarchy.cull(Frustum.from_camera(self))
+        self.cull_stats = self._hierarchy.stats
+        return draw
+
+    def _render_profiled(self, robot, profiler):
+        """與 render 走相同的繪製路徑，另外記錄各階段與每個 display list 的時間與 GL 呼叫數"""
+        profiler.begin_frame()
+        kinematics = robot.kinematics
+        profiler.measure("camera", self.apply_camera)
+        profiler.measure("kinematics", kinematics.update)
+        if not (self.skinning and profiler.measure("skinning", self.skinned.render, kinematics)):
+            draw = profiler.measure("cull", self.cull, kinematics)
+            self.display_lists.render(kinematics, default_canvas(), draw, profiler)
+        profiler.end_frame()
+
+        if self.hud is not None:
+            self.hud.draw(self.viewport_height)
+        if self.present is not None:
+            self.present()
+
+    def render_scene(self, scene):
+        """繪製 scene.Scene：每組相同網格只送出一次頂點與索引"""
+        self.apply_camera()
+
+        batches = scene.update()
+        frustum = Frustum.from_camera(self) if self.culling else None
+        world = scene.world_matrices() if self.culling else None
+        tested = drawn = 0
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        for batch in batches:
+            triangles, edges = batch.triangles, batch.edges
+            if frustum is not None:
+                # 每個實例的包圍盒一次測試完，只留下視錐內的索引
+                lower, upper = batch.mesh.bounds
+                count = len(batch.world_indices)
+                matrices = world[batch.world_indices]
+                inside = frustum.test(*transform_bounds(np.tile(lower, (count, 1)), np.tile(upper, (count, 1)), matrices))
+                tested += count
+                drawn += int(inside.sum())
+                if not inside.any():
+                    continue
+                if not inside.all():
+                    triangles = np.ascontiguousarray(triangles.reshape(count, -1)[inside]).ravel()
+                    edges = np.ascontiguousarray(edges.reshape(count, -1)[inside]).ravel()
+
+            glVertexPointer(3, GL_FLOAT, 0, batch.vertices)
+            if batch.fill:
+                glEnableClientState(GL_COLOR_ARRAY)
+                glColorPointer(3, GL_FLOAT, 0, batch.colors)
+                glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+                glDrawElements(GL_TRIANGLES, triangles.size, GL_UNSIGNED_INT, triangles)
+                glDisableClientState(GL_COLOR_ARRAY)
+
+            # 繪製黑色邊框
+            if batch.outline:
+                glColor3f(*Node.wireframe_color)
+                glDrawElements(GL_LINES, edges.size, GL_UNSIGNED_INT, edges)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        if frustum is not None:
+            self.cull_stats = {"total": tested, "tested": tested, "drawn": drawn, "culled_subtrees": 0}
+
+        if self.present is not None:
+            self.present()
@@ -0,0 +1,174 @@
+import numpy as np
+
+# 緩動曲線，輸入輸出皆為 0 ~ 1
+EASINGS = {
+    "linear": lambda u: u,
+    "ease_in": lambda u: u * u,
+    "ease_out": lambda u: 1 - (1 - u) ** 2,
+    "ease_in_out": lambda u: u * u * (3 - 2 * u),
+    "step": lambda u: np.floor(u),
+}
+
+
+class Track:
+    """單一關節的關鍵影格 [(時間, 角度), ...]"""
+    def __init__(self, joint_name, keys, easing="linear"):
+        self.joint_name = joint_name
+        keys = sorted(keys)
+        self.times = np.array([t for t, _ in keys], dtype=np.float64)
+        self.angles = np.array([a for _, a in keys], dtype=np.float64)
+        self.easing_name = easing
+        self.easing = EASINGS[easing]
+
+    @property
+    def end_time(self):
+        return self.times[-1]
+
+    def evaluate(self, times):
+        """一次算出多個時間點的角度"""
+        times = np.asarray(times, dtype=np.float64)
+        if len(self.times) == 1:
+            return np.full(times.shape, self.angles[0])
+        segment = np.clip(np.searchsorted(self.times, times, side="right") - 1, 0, len(self.times) - 2)
+        t0, t1 = self.times[segment], self.times[segment + 1]
+        u = np.clip((times - t0) / np.where(t1 > t0, t1 - t0, 1), 0, 1)
+        a0, a1 = self.angles[segment], self.angles[segment + 1]
+        return a0 + (a1 - a0) * self.easing(u)
+
+
+class Clip:
+    """具名的動畫片段，由多個關節軌道組成"""
+    def __init__(self, name, tracks, duration=None):
+        self.name = name
+        self.tracks = tracks
+        self.duration = duration if duration is not None else max(track.end_time for track in tracks)
+
+    def compile(self, joints, fps=60):
+        """預先取樣成 (影格數 x 關節數) 的角度陣列
+
+        沒有軌道的關節維持編譯當下的角度，且不會被 CompiledClip 改動。
+        """
+        names = [joint.name for joint in joints]
+        count = int(np.ceil(self.duration * fps)) + 1
+        times = np.arange(count) / fps
+        frames = np.tile(np.array([joint.angle for joint in joints], dtype=np.float32), (count, 1))
+        animated = np.zeros(len(joints), dtype=bool)
+        for track in self.tracks:
+            column = names.index(track.joint_name)
+            frames[:, column] = track.evaluate(times)
+            animated[column] = True
+        return CompiledClip(self.name, frames, fps, animated)
+
+
+class CompiledClip:
+    """編譯好的動畫，取樣只是一次陣列查表與內插"""
+    def __init__(self, name, frames, fps, animated):
+        self.name = name
+        self.frames = frames
+        self.fps = fps
+        self.animated = animated
+        self.duration = (len(frames) - 1) / fps
+
+    def sample(self, time):
+        """時間 time（秒）的姿勢，形狀 (關節數,)"""
+        if len(self.frames) == 1:
+            # 長度為 0 的片段只有一個影格
+            return self.frames[0].copy()
+        position = np.clip(time, 0, self.duration) * self.fps
+        index = min(int(position), len(self.frames) - 2)
+        frac = np.float32(position - index)
+        return self.frames[index] + (self.frames[index + 1] - self.frames[index]) * frac
+
+    def sample_many(self, times):
+        """一次取樣多個時間點，形狀 (len(times), 關節數)"""
+        if len(self.frames) == 1:
+            return np.tile(self.frames[0], (len(times), 1))
+        position = np.clip(np.asarray(times, dtype=np.float64), 0, self.duration) * self.fps
+        index = np.minimum(position.astype(np.int64), len(self.frames) - 2)
+        frac = (position - index).astype(np.float32)[:, None]
+        return self.frames[index] + (self.frames[index + 1] - self.frames[index]) * frac
+
+    def reversed(self):
+        return CompiledClip(self.name + "_reversed", self.frames[::-1].copy(), self.fps, self.animated)
+
+
+def blend(pose_a, pose_b, weight):
+    """兩個姿勢的線性混合，weight=0 為 pose_a"""
+    return pose_a + (pose_b - pose_a) * np.float32(weight)
+
+
+class ClipPlayer:
+    """播放、倒轉、拖曳與交叉淡入 CompiledClip"""
+    def __init__(self, joints):
+        self.joints = joints
+        self.clip = None
+        self.time = 0.0
+        self.speed = 1.0
+        self.loop = False
+        self.playing = False
+        # 交叉淡入時的前一個片段
+        self._previous = None
+        self._previous_time = 0.0
+        self._fade = 0.0
+        self._fade_elapsed = 0.0
+
+    def play(self, clip, speed=1.0, loop=False, fade=0.0):
+        if fade > 0 and self.clip is not None:
+            self._previous = self.clip
+            self._previous_time = self.time
+            self._fade = fade
+            self._fade_elapsed = 0.0
+        else:
+            self._previous = None
+        self.clip = clip
+        self.speed = speed
+        self.loop = loop
+        self.time = 0.0 if speed >= 0 else clip.duration
+        self.playing = True
+
+    def reverse(self):
+        self.speed = -self.speed
+        self.playing = True
+
+    def seek(self, time):
+        """拖曳到指定時間，不改變播放狀態"""
+        if self.clip is not None:
+            self.time = min(max(time, 0.0), self.clip.duration)
+
+    def stop(self):
+        self.playing = False
+
+    def advance(self, dt):
+        """推進 dt 秒，回傳目前姿勢（沒有片段時為 None）"""
+        if self.clip is None:
+            return None
+        if self.playing:
+            self.time += dt * self.speed
+            if self.loop and self.clip.duration > 0:
+                self.time %= self.clip.duration
+            elif not 0.0 <= self.time <= self.clip.duration:
+                self.time = min(max(self.time, 0.0), self.clip.duration)
+                self.playing = False
+            if self._previous is not None:
+                self._fade_elapsed += dt
+                if self._fade_elapsed >= self._fade:
+                    self._previous = None
+        return self.pose()
+
+    def pose(self):
+        pose = self.clip.sample(self.time)
+        if self._previous is not None:
+            previous = self._previous.sample(self._previous_time)
+            pose = blend(previous, pose, self._fade_elapsed / self._fade)
+        return pose
+
+    def apply(self, pose=None):
+        """把姿勢套用到有動畫軌道的關節
+
+        只設定角度；播放結束後由 Robot.sync_steps 把 step 與 state 對齊到這個角度。
+        """
+        if pose is None:
+            pose = self.pose()
+        for joint, angle, animated in zip(self.joints, pose, self.clip.animated):
+            if animated and joint.angle != angle:
+                joint.set_angle(float(angle))
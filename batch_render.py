@@ -0,0 +1,223 @@
+"""以多個程序批次離屏渲染：轉台、變形的每一步、實心與線框
+
+    python batch_render.py --turntable 36 --steps 0:21 --fills fill wireframe --size 256 256
+    python batch_render.py job.json --out renders --workers 4
+
+工作描述（JSON 檔或命令列參數）展開成 姿勢 × 相機角度 × 填充模式 × 解析度 的所有影格：
+
+    {"steps": [0, 5, 10, 21], "rot_y": {"count": 36}, "rot_x": [20],
+     "fills": ["fill", "wireframe"], "sizes": [[512, 512]], "scene": null}
+
+每個工作程序建立自己的 EGL context，只建立一次 Robot 並預先算好每個 step 的
+姿勢快照，之後每一格只需要還原姿勢、設定相機與填充模式再繪製。影格依解析度與姿勢
+排序後切成連續的小段分給各程序，同一段內很少需要切換狀態。
+輸出為 frame_00000.png 起編號的影像與描述每一格參數的 manifest.json。
+"""
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+DEFAULT_SPEC = {
+    "steps": [0],
+    "rot_y": [30.0],
+    "rot_x": [20.0],
+    "fills": ["fill"],
+    "sizes": [[512, 512]],
+    "scene": None,
+}
+
+
+def angles(value):
+    """角度清單，或 {"count": n, "start": 0, "stop": 360} 表示平均分布的 n 個角度"""
+    if isinstance(value, dict):
+        count = value["count"]
+        start = value.get("start", 0.0)
+        stop = value.get("stop", 360.0)
+        return [start + (stop - start) * i / count for i in range(count)]
+    if isinstance(value, (int, float)):
+        return [float(value)]
+    return [float(v) for v in value]
+
+
+def expand(spec):
+    """展開成影格清單，每一格為 dict(index, size, step, rot_x, rot_y, fill)"""
+    spec = {**DEFAULT_SPEC, **spec}
+    frames = []
+    for size in spec["sizes"]:
+        for step in spec["steps"]:
+            for fill in spec["fills"]:
+                if fill not in ("fill", "wireframe"):
+                    raise ValueError(f"未知的填充模式：{fill}")
+                for rot_x in angles(spec["rot_x"]):
+                    for rot_y in angles(spec["rot_y"]):
+                        frames.append({"index": len(frames), "size": list(size), "step": step,
+                                       "rot_x": rot_x, "rot_y": rot_y, "fill": fill})
+    return frames
+
+
+def chunks(frames, workers, per_worker=4):
+    """切成連續的小段；每個程序約分到 per_worker 段，做得快的程序可以多拿"""
+    if not frames:
+        return []
+    size = max(1, -(-len(frames) // (workers * per_worker)))
+    return [frames[i:i + size] for i in range(0, len(frames), size)]
+
+
+# ---- 工作程序 ----
+
+_worker = None
+
+
+class Worker:
+    """一個程序內的渲染狀態：Robot、各 step 的姿勢與各解析度的 OffscreenRenderer"""
+    def __init__(self, spec, out):
+        from robot import Robot
+        self.out = out
+        self.robot = Robot(create_view=False, scene_path=spec.get("scene"))
+        self.poses = {}
+        steps = sorted(set(spec.get("steps", DEFAULT_SPEC["steps"])))
+        for step in range(steps[-1] + 1 if steps else 1):
+            if step in steps:
+                self.poses[step] = self.robot.snapshot()
+            self.robot.all_add_step()
+        self.renderers = {}
+        self.current = None
+
+    def renderer(self, size):
+        import offscreen
+        key = tuple(size)
+        renderer = self.renderers.get(key)
+        if renderer is None:
+            renderer = self.renderers[key] = offscreen.OffscreenRenderer(*key)
+        elif self.current is not renderer:
+            renderer.make_current()
+        self.current = renderer
+        return renderer
+
+    def render(self, frame):
+        import offscreen
+        renderer = self.renderer(frame["size"])
+        robot = self.robot
+        robot.restore(self.poses[frame["step"]])
+        if robot.fill != (frame["fill"] == "fill"):
+            robot.change_fill()
+        renderer.view.view_rot_x = frame["rot_x"]
+        renderer.view.view_rot_y = frame["rot_y"]
+        image = renderer.render(robot)
+        offscreen.write_png(os.path.join(self.out, frame["file"]), image)
+
+
+def _init_worker(spec, out):
+    global _worker
+    _worker = Worker(spec, out)
+
+
+def _render_chunk(frames):
+    start = time.perf_counter()
+    for frame in frames:
+        _worker.render(frame)
+    return os.getpid(), len(frames), time.perf_counter() - start
+
+
+def render(spec, out="renders", workers=None, progress=None):
+    """渲染 spec 的所有影格並寫出 manifest.json，回傳 manifest"""
+    workers = workers or os.cpu_count() or 1
+    frames = expand(spec)
+    for frame in frames:
+        frame["file"] = f"frame_{frame['index']:05d}.png"
+    os.makedirs(out, exist_ok=True)
+
+    start = time.perf_counter()
+    per_process = {}
+    done = 0
+    if workers == 1:
+        # 單一程序時直接在本程序渲染，省下啟動工作程序的時間
+        _init_worker(spec, out)
+        results = map(_render_chunk, chunks(frames, 1))
+        pool = None
+    else:
+        # llvmpipe 預設每個 context 開多條執行緒，多程序時改成一條避免互搶核心
+        os.environ.setdefault("LP_NUM_THREADS", "1")
+        # spawn：工作程序不繼承父程序的任何 OpenGL 狀態
+        pool = multiprocessing.get_context("spawn").Pool(workers, _init_worker, (spec, out))
+        results = pool.imap_unordered(_render_chunk, chunks(frames, workers))
+    try:
+        for pid, count, seconds in results:
+            stats = per_process.setdefault(pid, [0, 0.0])
+            stats[0] += count
+            stats[1] += seconds
+            done += count
+            if progress is not None:
+                progress(done, len(frames))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+
+    manifest = {
+        "spec": {**DEFAULT_SPEC, **spec},
+        "workers": workers,
+        "seconds": elapsed,
+        "fps": len(frames) / elapsed if elapsed else 0.0,
+        "processes": [{"pid": pid, "frames": count, "render_seconds": seconds}
+                      for pid, (count, seconds) in sorted(per_process.items())],
+        "frames": frames,
+    }
+    with open(os.path.join(out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def parse_steps(text):
+    """"0:21" 表示 0 到 21（含），也可以是 "0,5,10" """
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop) + 1))
+    return [int(value) for value in text.split(",")]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="多程序批次離屏渲染")
+    parser.add_argument("job", nargs="?", help="JSON 工作描述檔；命令列參數會覆蓋其中的值")
+    parser.add_argument("--out", default="renders")
+    parser.add_argument("--workers", type=int, help="工作程序數，預設為 CPU 核心數")
+    parser.add_argument("--steps", type=parse_steps, help="例如 0:21 或 0,10,21")
+    parser.add_argument("--turntable", type=int, metavar="N", help="繞 y 軸平均取 N 個角度")
+    parser.add_argument("--rot-x", type=float, nargs="+")
+    parser.add_argument("--fills", nargs="+", choices=("fill", "wireframe"))
+    parser.add_argument("--size", type=int, nargs=2, action="append", metavar=("W", "H"))
+    parser.add_argument("--scene", help="場景描述檔（見 scene_file.py）")
+    args = parser.parse_args()
+
+    spec = {}
+    if args.job:
+        with open(args.job, encoding="utf-8") as f:
+            spec = json.load(f)
+    if args.steps is not None:
+        spec["steps"] = args.steps
+    if args.turntable is not None:
+        spec["rot_y"] = {"count": args.turntable}
+    if args.rot_x is not None:
+        spec["rot_x"] = args.rot_x
+    if args.fills is not None:
+        spec["fills"] = args.fills
+    if args.size is not None:
+        spec["sizes"] = args.size
+    if args.scene is not None:
+        spec["scene"] = args.scene
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end="", file=sys.stderr, flush=True)
+
+    manifest = render(spec, args.out, args.workers, progress)
+    print(file=sys.stderr)
+    print(f"{len(manifest['frames'])} 格，{manifest['workers']} 個程序，"
+          f"{manifest['seconds']:.1f} 秒（{manifest['fps']:.1f} fps），輸出到 {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""效能基準測試
+
+    python benchmark.py                        # 用計數 stub 執行（不需要顯示器或 GPU）
+    python benchmark.py --backend egl          # 用 EGL 離屏 context 實際繪製
+    python benchmark.py -o after.json --compare before.json
+
+結果包含每項的平均/最佳時間與每幀的 GL 呼叫次數，存成 JSON 方便跨 commit 比較。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def measure(function, number=100, repeat=5):
+    """回傳每次呼叫的 (平均, 最佳) 秒數"""
+    function()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        runs.append((time.perf_counter() - start) / number)
+    return sum(runs) / len(runs), min(runs)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark:
+    def __init__(self, counter, number, repeat):
+        self.counter = counter
+        self.number = number
+        self.repeat = repeat
+        self.results = {}
+
+    def run(self, name, function, number=None, per_call=None):
+        """per_call：每次呼叫處理的單位數（例如步數），用來算吞吐量"""
+        number = number or self.number
+        mean, best = measure(function, number, self.repeat)
+        self.counter.reset()
+        function()
+        result = {"mean_ms": mean * 1000, "best_ms": best * 1000, "gl_calls": self.counter.total()}
+        if per_call:
+            result["per_second"] = per_call / mean
+        self.results[name] = result
+        print(f"{name:<40} {mean * 1000:9.4f} ms  {best * 1000:9.4f} ms  {result['gl_calls']:6d} GL calls")
+
+    def startup(self, name, code, repeat=5):
+        """在新的直譯器中計時 code（含 import），並記錄是否載入了 OpenGL / pygame"""
+        script = ("import sys, time\n"
+                  "start = time.perf_counter()\n"
+                  f"{code}\n"
+                  "print(time.perf_counter() - start, 'OpenGL' in sys.modules, 'pygame' in sys.modules)")
+        times = []
+        for _ in range(repeat):
+            # 在本檔所在的目錄執行，從其他目錄啟動 benchmark.py 時也找得到模組
+            output = subprocess.check_output([sys.executable, "-c", script], text=True,
+                                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                                             stderr=subprocess.DEVNULL).split()[-3:]
+            times.append(float(output[0]))
+        result = {"mean_ms": sum(times) / len(times) * 1000, "best_ms": min(times) * 1000, "gl_calls": 0,
+                  "imports_gl": output[1] == "True", "imports_pygame": output[2] == "True"}
+        self.results[name] = result
+        print(f"{name:<40} {result['mean_ms']:9.4f} ms  {result['best_ms']:9.4f} ms  "
+              f"OpenGL={result['imports_gl']} pygame={result['imports_pygame']}")
+
+
+def run_startup(bench):
+    """模型層應該不需要 OpenGL；視圖在第一次使用 robot.view 時才載入"""
+    bench.startup("startup/import_robot", "import robot")
+    bench.startup("startup/robot_model", "import robot; robot.Robot()")
+    bench.startup("startup/robot_view", "import robot; robot.Robot().view")
+
+
+def run_benchmarks(args):
+    if args.backend == "egl":
+        # 必須在其他模組載入 OpenGL 之前
+        from offscreen import OffscreenRenderer
+        renderer = OffscreenRenderer(args.size, args.size)
+        view = renderer.view
+    from gl_stats import GLCallCounter
+    counter = GLCallCounter(passthrough=args.backend == "egl").install()
+
+    from components import Cube, Cylinder, Sphere, Wheel, default_canvas
+    from robot import Robot
+    if args.backend == "stub":
+        from RobotView import RobotView
+        view = RobotView(present=None)
+        finish = lambda: None
+    else:
+        # 等 GPU 畫完，讓時間包含實際的繪製
+        from OpenGL.GL import glFinish as finish
+
+    bench = Benchmark(counter, args.number, args.repeat)
+    canvas = default_canvas()
+    run_startup(bench)
+
+    print(f"{'benchmark':<40} {'mean':>12} {'best':>12}")
+    # 各種基本形狀的 draw()
+    bench.run("draw/cube", Cube("cube", scale=(2, 1, 3)).draw)
+    bench.run("draw/sphere", Sphere("sphere", radius=0.3).draw)
+    for segments in (8, 32, 128):
+        bench.run(f"draw/wheel[{segments}]", Wheel("wheel", 0.5, 1, 0.2, segments).draw)
+        bench.run(f"draw/cylinder[{segments}]", Cylinder("cylinder", 0.5, 4, segments).draw)
+    wire = Wheel("wheel", 0.5, 1, 0.2, 32)
+    wire.set_fill(False)
+    bench.run("draw/wheel[32] wireframe", wire.draw)
+
+    # 整棵樹的繪製
+    robot = Robot(create_view=False)
+    bench.run("render/node_tree", lambda: (robot.render_root.render(canvas), finish()))
+    bench.run("render/robot_view", lambda: (view.render(robot), finish()))
+
+    # 動畫與建構
+    stepper = Robot(create_view=False)
+    bench.run("animate/all_add_step", stepper.all_add_step, number=1000, per_call=1)
+    bench.run("animate/kinematics_update", lambda: (stepper.all_add_step(), stepper.kinematics.update()),
+              number=1000, per_call=1)
+    bench.run("build/create_robot_structure", robot.create_robot_structure, number=20)
+    bench.run("build/robot", lambda: Robot(create_view=False), number=20)
+
+    counter.uninstall()
+    return bench.results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\n{'benchmark':<40} {'before':>10} {'after':>10} {'ratio':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["mean_ms"]
+        after = result["mean_ms"]
+        print(f"{name:<40} {before:10.4f} {after:10.4f} {after / before:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="場景遍歷、繪製與動畫的效能基準測試")
+    parser.add_argument("--backend", choices=("stub", "egl"), default="stub",
+                        help="stub: 只計數 GL 呼叫；egl: 離屏 context 實際繪製")
+    parser.add_argument("--size", type=int, default=512, help="egl 模式的畫面大小")
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="把結果存成 JSON")
+    parser.add_argument("--compare", help="與先前的 JSON 結果比較")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "backend": args.backend,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import numpy as np
+from kinematics import rotation_matrices
+
+
+def perspective_matrix(fov, aspect, near, far):
+    """與 gluPerspective 相同的投影矩陣"""
+    f = 1.0 / np.tan(np.radians(fov) / 2)
+    m = np.zeros((4, 4))
+    m[0, 0] = f / aspect
+    m[1, 1] = f
+    m[2, 2] = (far + near) / (near - far)
+    m[2, 3] = 2 * far * near / (near - far)
+    m[3, 2] = -1
+    return m
+
+
+class Camera:
+    """視角參數與對應的矩陣，不需要 OpenGL"""
+    def __init__(self, aspect=1.0):
+        # 初始化視角參數
+        self.view_x = 0.0
+        self.view_y = 0.0
+        self.view_z = -15.0
+        self.view_rot_x = 0.0
+        self.view_rot_y = 0.0
+
+        # 投影參數
+        self.fov = 45
+        self.aspect = aspect
+        self.near = 0.1
+        self.far = 50.0
+
+    def camera(self):
+        """目前的視角參數，用來判斷畫面是否需要重畫"""
+        return (self.view_x, self.view_y, self.view_z, self.view_rot_x, self.view_rot_y)
+
+    def view_matrix(self):
+        """平移後先繞 x 軸再繞 y 軸旋轉，與 RobotView.apply_camera 相同"""
+        rx, ry = rotation_matrices([(self.view_rot_x, 1, 0, 0), (self.view_rot_y, 0, 1, 0)])
+        m = rx @ ry
+        m[:3, 3] = (self.view_x, self.view_y, self.view_z)
+        return m
+
+    def projection_matrix(self):
+        return perspective_matrix(self.fov, self.aspect, self.near, self.far)
@@ -0,0 +1,218 @@
+"""變形過程中的零件自我碰撞檢查
+
+    python collision.py                 # 檢查 all_add_step 0 ~ 21 步的每個姿勢
+    python collision.py robot.json 30   # 指定場景描述檔與步數
+
+每個可見零件以網格包圍盒（Mesh.bounds）在節點局部座標中的 OBB 表示，
+隨世界矩陣轉動。先把整個變形過程每一步的世界矩陣收集成 (步數, 節點數, 4, 4)，
+再一次對所有 步數 × 零件對 做分離軸測試（兩個盒子各 3 軸加上 9 個叉積軸）；
+15 個軸上都重疊就是碰撞，穿透深度為最小的重疊量。之前先用世界 AABB 過濾掉
+不可能相交的組合。
+
+同一個剛體群組內（kinematics.rigid_groups）的零件相對位置永遠不變，不檢查。
+只隔一個關節相連的零件仍然要檢查（例如尾巴轉進身體），只有在建立 Parts 時的姿勢下
+已經互相重疊、而且關節的轉軸中心同時落在兩個零件內的零件對，視為關節本來的接觸
+（Parts.allowed，例如 pelvis 與 legs），不檢查。
+"""
+import sys
+import time
+import numpy as np
+from culling import transform_bounds
+from kinematics import rigid_groups
+
+# 重疊量小於這個值視為剛好接觸，不算碰撞
+TOLERANCE = 1e-6
+
+
+class Parts:
+    """要檢查的零件：節點索引、局部 OBB 的中心與半長、要測試的零件對
+
+    以 kinematics 目前的姿勢判斷關節本來的接觸，allowed 為 [(關節名稱, 零件 a, 零件 b), ...]。
+    ignore 為另外不檢查的 (名稱, 名稱)。
+    """
+    def __init__(self, kinematics, ignore=()):
+        kinematics.update()
+        nodes = kinematics.nodes
+        indices, centers, extents = [], [], []
+        for i, node in enumerate(nodes):
+            bounds = node.local_bounds() if node.visible else None
+            if bounds is None:
+                continue
+            lower, upper = bounds
+            indices.append(i)
+            centers.append((lower + upper) / 2)
+            extents.append((upper - lower) / 2)
+        self.kinematics = kinematics
+        self.indices = np.array(indices, dtype=np.intp)
+        self.centers = np.array(centers, dtype=np.float64).reshape(-1, 3)
+        self.extents = np.array(extents, dtype=np.float64).reshape(-1, 3)
+        self.names = [nodes[i].name for i in indices]
+
+        # 每個零件所屬的群組，以及往上最近一個有零件的群組（中間隔著的關節）
+        group_of = {}
+        for root, members in rigid_groups(kinematics).items():
+            for i in members:
+                group_of[i] = root
+        has_parts = {group_of[i] for i in indices}
+
+        def linked(root):
+            parent = kinematics.parents[root]
+            while parent >= 0:
+                if group_of[parent] in has_parts:
+                    return group_of[parent]
+                parent = kinematics.parents[group_of[parent]]
+            return None
+
+        groups = [group_of[i] for i in indices]
+        links = {root: linked(root) for root in has_parts}
+        ignore = {frozenset(pair) for pair in ignore}
+        first, second, joints = [], [], []
+        for a in range(len(indices)):
+            for b in range(a + 1, len(indices)):
+                ga, gb = groups[a], groups[b]
+                if ga == gb:
+                    continue
+                if frozenset((self.names[a], self.names[b])) in ignore:
+                    continue
+                first.append(a)
+                second.append(b)
+                # 子群組 root 的父節點就是連接兩者的關節
+                if links[gb] == ga:
+                    joints.append(kinematics.parents[gb])
+                elif links[ga] == gb:
+                    joints.append(kinematics.parents[ga])
+                else:
+                    joints.append(-1)
+        self.first = np.array(first, dtype=np.intp)
+        self.second = np.array(second, dtype=np.intp)
+        self.allowed = self._allowed_contacts(np.array(joints, dtype=np.intp))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _allowed_contacts(self, joints):
+        """找出關節本來的接觸並從零件對中移除"""
+        kinematics = self.kinematics
+        linked = np.flatnonzero(joints >= 0)
+        a, b = self.first[linked], self.second[linked]
+        matrices = kinematics.world[self.indices]
+        rotations = matrices[:, :3, :3]
+        centers = np.einsum("nij,nj->ni", rotations, self.centers) + matrices[:, :3, 3]
+        depth = obb_overlap(centers[a], rotations[a], self.extents[a], centers[b], rotations[b], self.extents[b])
+        allowed, keep = [], np.ones(len(self.first), dtype=bool)
+        for pair, part_a, part_b, overlap in zip(linked.tolist(), a.tolist(), b.tolist(), depth.tolist()):
+            if overlap <= TOLERANCE:
+                continue
+            pivot = kinematics.world[joints[pair]][:, 3]
+            if self._contains(part_a, pivot) and self._contains(part_b, pivot):
+                keep[pair] = False
+                allowed.append((kinematics.nodes[joints[pair]].name, self.names[part_a], self.names[part_b]))
+        self.first = self.first[keep]
+        self.second = self.second[keep]
+        return allowed
+
+    def _contains(self, part, point):
+        """世界座標的 point 是否在零件的 OBB 內（含邊界）"""
+        local = np.linalg.solve(self.kinematics.world[self.indices[part]], point)[:3]
+        return bool(np.all(np.abs(local - self.centers[part]) <= self.extents[part] + TOLERANCE))
+
+
+def sweep_poses(robot, steps=21):
+    """robot 從目前姿勢連續 all_add_step 的 steps + 1 個世界矩陣 (steps + 1, 節點數, 4, 4)
+
+    結束後還原成原本的姿勢。
+    """
+    pose = robot.snapshot()
+    kinematics = robot.kinematics
+    worlds = np.empty((steps + 1,) + kinematics.world.shape)
+    for step in range(steps + 1):
+        kinematics.update()
+        worlds[step] = kinematics.world
+        if step < steps:
+            robot.all_add_step()
+    robot.restore(pose)
+    return worlds
+
+
+def obb_overlap(center_a, axes_a, extent_a, center_b, axes_b, extent_b):
+    """批次分離軸測試，各參數的前面維度相同（例如 (m,)）
+
+    axes 為 (..., 3, 3) 旋轉矩陣（每一欄是盒子的一個軸）。回傳每組在 15 個軸上的最小
+    重疊量；負數表示找到分離軸。
+    """
+    a_axes = np.swapaxes(axes_a, -1, -2)
+    b_axes = np.swapaxes(axes_b, -1, -2)
+    cross = np.cross(a_axes[..., :, None, :], b_axes[..., None, :, :])
+    cross = cross.reshape(cross.shape[:-3] + (9, 3))
+    axes = np.concatenate([a_axes, b_axes, cross], axis=-2)
+    length = np.linalg.norm(axes, axis=-1)
+    # 兩軸平行時叉積為 0，不是有效的分離軸
+    valid = length > 1e-9
+    axes = axes / np.where(valid, length, 1.0)[..., None]
+
+    radius_a = np.einsum("...ak,...k->...a", np.abs(axes @ axes_a), extent_a)
+    radius_b = np.einsum("...ak,...k->...a", np.abs(axes @ axes_b), extent_b)
+    distance = np.abs(np.einsum("...ak,...k->...a", axes, center_b - center_a))
+    overlap = np.where(valid, radius_a + radius_b - distance, np.inf)
+    return overlap.min(axis=-1)
+
+
+def check(parts, worlds):
+    """回傳 (步, 零件 a, 零件 b, 穿透深度) 的陣列，依步數排序"""
+    steps = len(worlds)
+    matrices = worlds[:, parts.indices]
+    rotations = matrices[..., :3, :3]
+    centers = np.einsum("snij,nj->sni", rotations, parts.centers) + matrices[..., :3, 3]
+
+    # 先以世界 AABB 排除不可能相交的 (步, 零件對)
+    lower, upper = transform_bounds(
+        np.tile(parts.centers - parts.extents, (steps, 1)),
+        np.tile(parts.centers + parts.extents, (steps, 1)),
+        matrices.reshape(-1, 4, 4))
+    lower = lower.reshape(steps, -1, 3)
+    upper = upper.reshape(steps, -1, 3)
+    a, b = parts.first, parts.second
+    close = ((lower[:, a] <= upper[:, b] + TOLERANCE) & (lower[:, b] <= upper[:, a] + TOLERANCE)).all(axis=2)
+    step, pair = np.nonzero(close)
+    a, b = a[pair], b[pair]
+
+    depth = obb_overlap(centers[step, a], rotations[step, a], parts.extents[a],
+                        centers[step, b], rotations[step, b], parts.extents[b])
+    hit = depth > TOLERANCE
+    return step[hit], a[hit], b[hit], depth[hit]
+
+
+def report(parts, result):
+    """{步: [(名稱 a, 名稱 b, 穿透深度), ...]}"""
+    collisions = {}
+    for step, a, b, depth in zip(*result):
+        collisions.setdefault(int(step), []).append((parts.names[a], parts.names[b], float(depth)))
+    return collisions
+
+
+def main():
+    from robot import Robot
+    scene_path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].isdigit() else None
+    steps = int(sys.argv[-1]) if len(sys.argv) > 1 and sys.argv[-1].isdigit() else 21
+    robot = Robot(create_view=False, scene_path=scene_path)
+    parts = Parts(robot.kinematics)
+
+    start = time.perf_counter()
+    worlds = sweep_poses(robot, steps)
+    posed = time.perf_counter()
+    result = check(parts, worlds)
+    end = time.perf_counter()
+
+    collisions = report(parts, result)
+    for step in range(steps + 1):
+        pairs = collisions.get(step, [])
+        text = "、".join(f"{a}/{b} {depth:.3f}" for a, b, depth in pairs) or "無"
+        print(f"step {step:2d}: {text}")
+    allowed = "、".join(f"{a}/{b}（{joint}）" for joint, a, b in parts.allowed) or "無"
+    print(f"關節本來的接觸，不檢查：{allowed}")
+    print(f"{len(parts)} 個零件、{len(parts.first)} 組零件對、{steps + 1} 個姿勢："
+          f"姿勢 {(posed - start) * 1000:.2f} ms，碰撞測試 {(end - posed) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
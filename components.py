@@ -1,10 +1,28 @@
-from OpenGL.GL import *
-from OpenGL.GLU import *
-import math
+import weakref
+
 import numpy as np
+from mesh import mesh_cache, build_cube_mesh, build_wheel_mesh, build_cylinder_mesh, build_sphere_mesh
+from pose import pose_store, STATES
+
+_default_canvas = None
+
+def default_canvas():
+    """沒有指定繪圖介面時使用 OpenGL（第一次繪製時才載入）"""
+    global _default_canvas
+    if _default_canvas is None:
+        from gl_backend import GLCanvas
+        _default_canvas = GLCanvas()
+    return _default_canvas
 
 class Node:
+    # 節點數量可能很多（多台機器人、姿勢歷史），不使用 __dict__
+    __slots__ = ("name", "children", "translation", "rotation", "visible", "parent", "color", "fill",
+                 "_mesh", "_mesh_key", "version", "style_version", "kinematics", "kinematics_index")
     wireframe_color = (0, 0, 0)
+    # 任何節點的外觀或變換改變時遞增，用來判斷畫面是否需要重畫
+    revision = 0
+    # 只在外觀或結構（顏色、填充、形狀、子節點）改變時遞增
+    style_revision = 0
     """基礎節點類，提供基本的變換和渲染功能"""
     def __init__(self, name):
         self.name = name
@@ -15,46 +33,97 @@ class Node:
         self.parent = None
         self.color = (1.0, 1.0, 1.0)  # 預設白色
         self.fill = True
+        self._mesh = None
+        self._mesh_key = None
+        # 節點自身的變更次數：version 包含變換，style_version 只算外觀
+        self.version = 0
+        self.style_version = 0
+        # 所屬的 kinematics.Kinematics，由它設定
+        self.kinematics = None
+        self.kinematics_index = -1
     
     def add_child(self, child):
         self.children.append(child)
         child.parent = self
+        self._touch(style=True)
+        if self.kinematics is not None:
+            self.kinematics.invalidate()
         return child
         
     def set_translation(self, x, y, z):
         self.translation = [x, y, z]
+        self._touch()
+        if self.kinematics is not None:
+            self.kinematics.mark_dirty(self)
         
     def set_rotation(self, angle, x, y, z):
         self.rotation = [angle, x, y, z]
+        self._touch()
+        if self.kinematics is not None:
+            self.kinematics.mark_dirty(self)
         
     def set_color(self, r, g, b):
         self.color = (r, g, b)
+        self._touch(style=True)
     
     def set_fill(self, fill):
         self.fill = fill
+        self._touch(style=True)
 
-    def render(self):
+    def _touch(self, style=False):
+        """記錄變更：場景計數與節點自身的版本"""
+        Node.revision += 1
+        self.version += 1
+        if style:
+            Node.style_revision += 1
+            self.style_version += 1
+
+    def render(self, canvas=None):
         """基礎渲染方法"""
-        glPushMatrix()
-        
+        if canvas is None:
+            canvas = default_canvas()
         # 先進行平移和旋轉
-        glTranslatef(*self.translation)
-        if self.rotation[0] != 0:
-            glRotatef(*self.rotation)
+        canvas.push_transform(self.translation, self.rotation)
         
         # 如果可見就繪製
         if self.visible:
-            self.draw()
+            self.draw(canvas)
 
         # 繪製所有子節點
         for child in self.children:
-            child.render()
+            child.render(canvas)
             
-        glPopMatrix()
+        canvas.pop_transform()
     
-    def draw(self):
-        """由子類實現具體的繪製方法"""
-        pass
+    def mesh_key(self):
+        """決定網格形狀的參數，None 表示沒有網格"""
+        return None
+
+    def build_mesh(self):
+        """由子類實現，產生 mesh.Mesh"""
+        return None
+
+    def get_mesh(self):
+        """取得網格，相同形狀的節點共用同一份快取"""
+        key = self.mesh_key()
+        if key != self._mesh_key:
+            self._mesh = None if key is None else mesh_cache.get(key, self.build_mesh)
+            self._mesh_key = key
+        return self._mesh
+
+    def local_bounds(self):
+        """局部座標的包圍盒 (最小角, 最大角)，沒有網格時為 None"""
+        mesh = self.get_mesh()
+        return None if mesh is None else mesh.bounds
+
+    def draw(self, canvas=None):
+        """把網格交給繪圖介面（OpenGL 或軟體光柵化）"""
+        mesh = self.get_mesh()
+        if mesh is None:
+            return
+        if canvas is None:
+            canvas = default_canvas()
+        canvas.draw_mesh(mesh, self.color, self.fill, self.wireframe_color)
 
 class Cube(Node):
     """立方體節點"""
@@ -63,12 +132,27 @@ class Cube(Node):
             (0.5, 0.5, 0.5), (-0.5, 0.5, 0.5), (-0.5, -0.5, 0.5), (0.5, -0.5, 0.5)
         ]
     
-    def __init__(self, name, scale=(1,1,1)):
+    __slots__ = ("scale", "_vertices", "_vertices_key")
+
+    def __init__(self, name, scale=(1,1,1), vertices=None):
         super().__init__(name)
         self.scale = scale
         self.fill = True
         self.visible = True
-        self.vertices = self.set_vertices_by_scale()
+        # 已經知道頂點時（例如從快取載入）不必重新計算
+        self.vertices = vertices if vertices is not None else self.set_vertices_by_scale()
+
+    @property
+    def vertices(self):
+        return self._vertices
+
+    @vertices.setter
+    def vertices(self, vertices):
+        # 以 (8, 3) 陣列保存，比巢狀 list 省記憶體
+        self._vertices = np.array(vertices, dtype=np.float64).reshape(8, 3)
+        self._touch(style=True)
+        # 頂點改變時才需要重建網格
+        self._vertices_key = self._vertices.tobytes()
 
     def set_vertices_by_scale(self):
         # 將 vertices, scale, offset 轉換為 NumPy 陣列
@@ -87,32 +171,16 @@ class Cube(Node):
         
         self.vertices = transformed_vertices.tolist()
 
-    def draw(self):
-        faces = [
-            (0,1,2,3), (4,5,6,7), (0,4,7,3),
-            (1,5,6,2), (0,1,5,4), (3,2,6,7)
-        ]
-        
-        if self.fill:
-            glColor3f(*self.color)
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-            for face in faces:
-                glBegin(GL_QUADS)
-                for vertex in face:
-                    glVertex3fv(self.vertices[vertex])
-                glEnd()
-        
-        # 繪製黑色邊框
-        glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
-        glColor3f(*self.wireframe_color)
-        for face in faces:
-            glBegin(GL_LINE_LOOP)
-            for vertex in face:
-                glVertex3fv(self.vertices[vertex])
-            glEnd()
+    def mesh_key(self):
+        return ("cube", self._vertices_key)
+
+    def build_mesh(self):
+        return build_cube_mesh(self.vertices)
 
 class Sphere(Node):
     """球體節點"""
+    __slots__ = ("radius", "slices", "stacks")
+
     def __init__(self, name, radius=0.5, slices=16, stacks=16):
         super().__init__(name)
         self.radius = radius
@@ -121,23 +189,30 @@ class Sphere(Node):
         self.fill = True
         self.visible = True
     
-    def draw(self):
-        quadric = gluNewQuadric()
-        if self.fill:
-            glColor3f(*self.color)
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-            gluQuadricDrawStyle(quadric, GLU_FILL)
-            gluSphere(quadric, self.radius, self.slices, self.stacks)
-        else:
-            glColor3f(*self.wireframe_color)
-            gluQuadricDrawStyle(quadric, GLU_LINE)
-            gluSphere(quadric, self.radius, self.slices, self.stacks)
-        gluDeleteQuadric(quadric)
+    def mesh_key(self):
+        return ("sphere", self.radius, self.slices, self.stacks)
+
+    def build_mesh(self):
+        # 批次繪製與軟體光柵化時使用；OpenGL 單獨繪製仍交給 gluSphere
+        return build_sphere_mesh(self.radius, self.slices, self.stacks)
+
+    def draw(self, canvas=None):
+        if canvas is None:
+            canvas = default_canvas()
+        canvas.draw_sphere(self.radius, self.slices, self.stacks, self.color, self.fill, self.wireframe_color)
 
 class Joint(Sphere):
-    """關節節點，繼承自球體"""
+    """關節節點，繼承自球體
+
+    angle、step、state 存放在 pose.pose_store 的陣列中（以 joint_id 索引），
+    關節被回收時歸還 joint_id。
+    """
+    __slots__ = ("min_angle", "max_angle", "axis", "joint_id", "__weakref__")
+
     def __init__(self, name, angle_limit=(-360, 360), axis=(0, 0, 1), radius=0.5):
         super().__init__(name, radius=radius)
+        self.joint_id = pose_store.allocate()
+        weakref.finalize(self, pose_store.free, self.joint_id)
         self.min_angle, self.max_angle = angle_limit
         self.axis = axis
         self.set_angle(self.min_angle)
@@ -145,16 +220,41 @@ class Joint(Sphere):
         self.fill = False
         self.state = "dinosaur"
         self.step = 0 # max step = 19
+
+    @property
+    def angle(self):
+        return float(pose_store.angles[self.joint_id])
+
+    @angle.setter
+    def angle(self, angle):
+        pose_store.angles[self.joint_id] = angle
+
+    @property
+    def step(self):
+        return int(pose_store.steps[self.joint_id])
+
+    @step.setter
+    def step(self, step):
+        pose_store.steps[self.joint_id] = step
+
+    @property
+    def state(self):
+        return STATES[pose_store.states[self.joint_id]]
+
+    @state.setter
+    def state(self, state):
+        pose_store.states[self.joint_id] = STATES.index(state)
     
     def set_angle(self, angle):
         # 限制角度在範圍內
-        self.angle = max(self.min_angle, min(self.max_angle, angle))
+        angle = max(self.min_angle, min(self.max_angle, angle))
+        self.angle = angle
         # 設置自身的旋轉
-        self.set_rotation(self.angle, *self.axis)
+        self.set_rotation(angle, *self.axis)
         
         # 將相同的旋轉應用到所有直接子節點
         for child in self.children:
-            child.set_rotation(self.angle, *self.axis)
+            child.set_rotation(angle, *self.axis)
         
     def rotate(self):
         self.add_step()
@@ -182,73 +282,25 @@ class Joint(Sphere):
 
 class Wheel(Node):
     """中空圓柱體輪子節點"""
+    __slots__ = ("inner_radius", "outer_radius", "height", "segments")
+
     def __init__(self, name, inner_radius=0.3, outer_radius=0.5, height=0.2, segments=32):
         super().__init__(name)
         self.inner_radius = inner_radius
         self.outer_radius = outer_radius
         self.height = height
         self.segments = segments
-    
-    def draw(self):
-        h = self.height / 2
-        
-        if self.fill:
-            glColor3f(*self.color)
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-            # 繪製頂面和底面
-            for y in [h, -h]:
-                glBegin(GL_QUAD_STRIP)
-                for i in range(self.segments + 1):
-                    angle = 2 * math.pi * i / self.segments
-                    x_outer = self.outer_radius * math.cos(angle)
-                    z_outer = self.outer_radius * math.sin(angle)
-                    x_inner = self.inner_radius * math.cos(angle)
-                    z_inner = self.inner_radius * math.sin(angle)
-                    glVertex3f(x_outer, y, z_outer)
-                    glVertex3f(x_inner, y, z_inner)
-                glEnd()
-            
-            # 繪製外側面和內側面
-            for radius in [self.outer_radius, self.inner_radius]:
-                glBegin(GL_QUAD_STRIP)
-                for i in range(self.segments + 1):
-                    angle = 2 * math.pi * i / self.segments
-                    x = radius * math.cos(angle)
-                    z = radius * math.sin(angle)
-                    glVertex3f(x, h, z)
-                    glVertex3f(x, -h, z)
-                glEnd()
-        
-        # 繪製黑色線框
-        glColor3f(*self.wireframe_color)
-        self._draw_wireframe(h)
-    
-    def _draw_wireframe(self, h):
-        """繪製線框"""
-        # 繪製頂部和底部的圓
-        for y in [h, -h]:
-            for radius in [self.outer_radius, self.inner_radius]:
-                glBegin(GL_LINE_LOOP)
-                for i in range(self.segments):
-                    angle = 2 * math.pi * i / self.segments
-                    x = radius * math.cos(angle)
-                    z = radius * math.sin(angle)
-                    glVertex3f(x, y, z)
-                glEnd()
-        
-        # 繪製連接線
-        for radius in [self.outer_radius, self.inner_radius]:
-            glBegin(GL_LINES)
-            for i in range(self.segments):
-                angle = 2 * math.pi * i / self.segments
-                x = radius * math.cos(angle)
-                z = radius * math.sin(angle)
-                glVertex3f(x, h, z)
-                glVertex3f(x, -h, z)
-            glEnd()
+
+    def mesh_key(self):
+        return ("wheel", self.inner_radius, self.outer_radius, self.height, self.segments)
+
+    def build_mesh(self):
+        return build_wheel_mesh(self.inner_radius, self.outer_radius, self.height, self.segments)
 
 class Cylinder(Node):
     """實心圓柱體節點"""
+    __slots__ = ("radius", "height", "segments")
+
     def __init__(self, name, radius=0.5, height=1.0, segments=32):
         super().__init__(name)
         self.radius = radius
@@ -256,57 +308,26 @@ class Cylinder(Node):
         self.segments = segments
         self.fill = True
         self.visible = True
-    
-    def draw(self):
-        h = self.height / 2
-        
-        if self.fill:
-            glColor3f(*self.color)
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-            # 繪製頂面和底面
-            for y in [h, -h]:
-                glBegin(GL_TRIANGLE_FAN)
-                glVertex3f(0, y, 0)  # 圓心
-                for i in range(self.segments + 1):
-                    angle = 2 * math.pi * i / self.segments
-                    x = self.radius * math.cos(angle)
-                    z = self.radius * math.sin(angle)
-                    glVertex3f(x, y, z)
-                glEnd()
-            
-            # 繪製側面
-            glBegin(GL_QUAD_STRIP)
-            for i in range(self.segments + 1):
-                angle = 2 * math.pi * i / self.segments
-                x = self.radius * math.cos(angle)
-                z = self.radius * math.sin(angle)
-                glVertex3f(x, h, z)
-                glVertex3f(x, -h, z)
-            glEnd()
-        
-        # 繪製黑色線框
-        glColor3f(*self.wireframe_color)
-        self._draw_wireframe(h)
-    
-    def _draw_wireframe(self, h):
-        """繪製線框"""
-        # 繪製頂部和底部的圓
-        for y in [h, -h]:
-            glBegin(GL_LINE_LOOP)
-            for i in range(self.segments):
-                angle = 2 * math.pi * i / self.segments
-                x = self.radius * math.cos(angle)
-                z = self.radius * math.sin(angle)
-                glVertex3f(x, y, z)
-            glEnd()
-        
-        # 繪製連接線
-        glBegin(GL_LINES)
-        for i in range(self.segments):
-            angle = 2 * math.pi * i / self.segments
-            x = self.radius * math.cos(angle)
-            z = self.radius * math.sin(angle)
-            glVertex3f(x, h, z)
-            glVertex3f(x, -h, z)
-        glEnd()
 
+    def mesh_key(self):
+        return ("cylinder", self.radius, self.height, self.segments)
+
+    def build_mesh(self):
+        return build_cylinder_mesh(self.radius, self.height, self.segments)
+
+
+def has_outline(node):
+    """可見且有網格的零件都畫邊框；實心的球體例外（與 GLCanvas.draw_sphere 相同）"""
+    return node.visible and not (isinstance(node, Sphere) and node.fill)
+
+
+def collect_joints(root):
+    """依前序列出 root 底下所有的 Joint"""
+    joints = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Joint):
+            joints.append(node)
+        stack.extend(reversed(node.children))
+    return joints
@@ -0,0 +1,401 @@
+"""讓其他程序透過 socket 控制機器人
+
+    python main.py --control 8765                  # 視窗程式開啟控制埠
+    python control.py serve --port 8765            # 不開視窗的模擬（測試用）
+    python control.py bench --port 8765            # 大量送出指令並顯示延遲
+    python control.py send --port 8765 "angle tail_joint 30" stats
+
+每行一個文字指令：
+
+    angle <關節> <角度>           設定角度
+    step <關節|all> [次數]        Joint.rotate()，all 為 Robot.all_add_step()；次數最多 MAX_STEPS
+    state                         Robot.change_state()
+    fill                          Robot.change_fill()
+    camera x y z rot_x rot_y      設定相機
+    stats                         回傳一行 JSON：收到與套用的指令數、延遲百分位數
+    ping                          回傳 pong
+
+成功的指令不回覆，格式錯誤時回覆 "error <序號> <原因>"，序號為這個連線上第幾個
+非空白指令（從 1 開始），所以客戶端可以把 stats、ping 的回覆與錯誤分開。
+
+伺服器在背景執行緒的 asyncio 事件迴圈中接收與解析，解析後的指令放進佇列；
+主迴圈在每個模擬 tick 開始時一次取出，依收到的順序套用，只合併相鄰的同類指令
+（angle 每個關節只保留最後一個、step 次數相加、state 與 fill 只看奇偶、
+camera 只保留最後一個），不會被網路阻塞。延遲為收到指令到套用它的那一幀畫完的時間。
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from frame_pacing import FramePacer, InputLatency
+
+# 單一 step 指令（以及合併後的一段 step）最多執行的次數，避免一個 tick 卡住繪圖迴圈
+MAX_STEPS = 100
+
+
+def _number(text):
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"不是有限的數值：{text}")
+    return value
+
+
+def parse(line, joints):
+    """把一行文字轉成 (種類, 參數)，格式錯誤時丟出 ValueError"""
+    parts = line.split()
+    if not parts:
+        raise ValueError("空指令")
+    name, args = parts[0], parts[1:]
+    if name == "angle" and len(args) == 2:
+        return name, (joints[args[0]], _number(args[1]))
+    if name == "step" and len(args) in (1, 2):
+        count = int(args[1]) if len(args) == 2 else 1
+        if count < 0:
+            raise ValueError(f"次數不能是負數：{count}")
+        return name, (None if args[0] == "all" else joints[args[0]], min(count, MAX_STEPS))
+    if name in ("state", "fill") and not args:
+        return name, None
+    if name == "camera" and len(args) == 5:
+        return name, tuple(_number(value) for value in args)
+    raise ValueError(f"無法解析的指令：{line}")
+
+
+class CommandBatch:
+    """一個 tick 內收到的指令，依收到的順序分成多段，每段是相鄰的同一類指令
+
+    "step all" 與單一關節的 step 是不同的段。
+    """
+    def __init__(self):
+        self.runs = []
+
+    def add(self, name, args):
+        kind = ("step", args[0] is None) if name == "step" else name
+        if not self.runs or self.runs[-1][0] != kind:
+            self.runs.append([kind, self._empty(name)])
+        run = self.runs[-1]
+        if name == "angle":
+            joint, angle = args
+            run[1][joint] = angle
+        elif name == "step":
+            joint, count = args
+            run[1][joint] = min(run[1].get(joint, 0) + count, MAX_STEPS)
+        elif name in ("state", "fill"):
+            run[1] = not run[1]
+        elif name == "camera":
+            run[1] = args
+
+    @staticmethod
+    def _empty(name):
+        if name in ("angle", "step"):
+            return {}
+        if name in ("state", "fill"):
+            return False
+        return None
+
+    def apply(self, robot, camera=None):
+        for kind, value in self.runs:
+            if kind == "angle":
+                for joint, angle in value.items():
+                    joint.set_angle(angle)
+            elif kind[0] == "step":
+                for joint, count in value.items():
+                    for _ in range(count):
+                        if joint is None:
+                            robot.all_add_step()
+                        else:
+                            joint.rotate()
+            elif kind == "state":
+                if value:
+                    robot.change_state()
+            elif kind == "fill":
+                if value:
+                    robot.change_fill()
+            elif kind == "camera":
+                if camera is not None:
+                    (camera.view_x, camera.view_y, camera.view_z,
+                     camera.view_rot_x, camera.view_rot_y) = value
+
+
+class ControlServer:
+    """接收控制指令的伺服器
+
+    address 為 TCP 埠號（只聽 127.0.0.1）或 Unix socket 路徑。wake 會在佇列由空
+    變成非空時從伺服器執行緒呼叫，用來喚醒正在等待事件的主迴圈。
+    """
+    def __init__(self, robot, address=8765, camera=None, wake=None):
+        self.robot = robot
+        self.address = address
+        self.camera = camera
+        self.wake = wake
+        self.joints = {joint.name: joint for joint in robot.joints}
+        self.received = 0
+        self.applied = 0
+        self.errors = 0
+        self.latency = InputLatency()
+        self._lock = threading.Lock()
+        self._queue = []
+        self._times = []
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def pending(self):
+        return bool(self._queue)
+
+    # ---- 伺服器執行緒 ----
+
+    def start(self):
+        """在背景執行緒啟動，等到開始聽取連線才返回"""
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._server = self._loop.run_until_complete(self._listen())
+            except OSError as error:
+                failure.append(error)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="control-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        return self
+
+    @property
+    def unix(self):
+        return not (isinstance(self.address, int) or str(self.address).isdigit())
+
+    def _listen(self):
+        if not self.unix:
+            return asyncio.start_server(self._handle, "127.0.0.1", int(self.address))
+        return asyncio.start_unix_server(self._handle, str(self.address))
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            if self.unix:
+                try:
+                    os.unlink(str(self.address))
+                except FileNotFoundError:
+                    pass
+
+    async def _handle(self, reader, writer):
+        buffer = b""
+        sequence = 0
+        try:
+            while True:
+                # 一次讀一大塊再切行，比逐行 readline 少很多次排程
+                data = await reader.read(65536)
+                if not data:
+                    break
+                lines = (buffer + data).split(b"\n")
+                buffer = lines.pop()
+                replies, sequence = self._receive(lines, sequence)
+                if replies:
+                    writer.write("".join(reply + "\n" for reply in replies).encode())
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _receive(self, lines, sequence=0):
+        """解析一塊資料中的所有指令並放進佇列，回傳 (需要回覆的內容, 最後一個指令的序號)"""
+        now = time.perf_counter()
+        commands, replies = [], []
+        for line in lines:
+            line = line.decode(errors="replace").strip()
+            if not line:
+                continue
+            sequence += 1
+            if line == "stats":
+                # 統計要包含同一塊資料中排在前面的指令
+                self._enqueue(commands, now)
+                commands = []
+                replies.append(json.dumps(self.stats()))
+                continue
+            if line == "ping":
+                replies.append("pong")
+                continue
+            try:
+                commands.append(parse(line, self.joints))
+            except (ValueError, KeyError) as error:
+                self.errors += 1
+                replies.append(f"error {sequence} {error}")
+        self._enqueue(commands, now)
+        return replies, sequence
+
+    def _enqueue(self, commands, now):
+        if not commands:
+            return
+        with self._lock:
+            was_empty = not self._queue
+            self._queue.extend(commands)
+            self._times.append((now, len(commands)))
+            self.received += len(commands)
+        if was_empty and self.wake is not None:
+            self.wake()
+
+    # ---- 主執行緒 ----
+
+    def apply(self):
+        """取出所有等待中的指令，合併後套用；回傳套用的指令數"""
+        if not self._queue:
+            return 0
+        with self._lock:
+            commands, self._queue = self._queue, []
+            times, self._times = self._times, []
+        batch = CommandBatch()
+        for name, args in commands:
+            batch.add(name, args)
+        batch.apply(self.robot, self.camera)
+        self.applied += len(commands)
+        for received, count in times:
+            self.latency.mark(count, received)
+        return len(commands)
+
+    def frame_presented(self):
+        """一幀畫完後呼叫，記錄這一幀套用的指令的延遲"""
+        self.latency.presented()
+
+    def frame_skipped(self):
+        """主迴圈要閒置等待時呼叫，還沒畫出來的指令（沒有造成變化）不計入延遲"""
+        self.latency.discard()
+
+    def stats(self):
+        result = {"received": self.received, "applied": self.applied, "errors": self.errors}
+        percentiles = self.latency.percentiles()
+        if percentiles is not None:
+            result["latency_p50_ms"], result["latency_p99_ms"] = percentiles
+        return result
+
+
+def serve(address, seconds=None, fps=60):
+    """不開視窗的模擬迴圈：每幀推進模擬並更新世界矩陣，代替繪圖"""
+    from robot import Robot
+    from camera import Camera
+    from simulation import Simulation
+    robot = Robot(create_view=False)
+    camera = Camera()
+    simulation = Simulation(robot)
+    server = ControlServer(robot, address, camera=camera).start()
+    simulation.control = server
+    print(f"listening on {address}")
+    pacer = FramePacer(fps)
+    frames = 0
+    start = last = time.perf_counter()
+    try:
+        while seconds is None or last - start < seconds:
+            now = time.perf_counter()
+            simulation.advance(now - last)
+            last = now
+            robot.kinematics.update()
+            server.frame_presented()
+            frames += 1
+            pacer.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"{frames} 幀，{pacer.late} 幀超過 {pacer.frame_time * 1000:.1f} ms，{server.stats()}")
+
+
+async def _session(address):
+    if isinstance(address, int) or str(address).isdigit():
+        return await asyncio.open_connection("127.0.0.1", int(address))
+    return await asyncio.open_unix_connection(str(address))
+
+
+async def _send(address, lines):
+    """送出 lines 後再送一個 ping，讀到它的 pong 為止；回傳依序收到的所有回覆"""
+    reader, writer = await _session(address)
+    lines = [line for line in lines if line.strip()]
+    writer.write("".join(line + "\n" for line in lines + ["ping"]).encode())
+    await writer.drain()
+    # 只有 stats 與 ping 一定有回覆，錯誤回覆以 "error " 開頭
+    expected = sum(line.strip() in ("stats", "ping") for line in lines) + 1
+    replies = []
+    while expected:
+        reply = (await reader.readline()).decode().strip()
+        if not reply:
+            break
+        replies.append(reply)
+        if not reply.startswith("error "):
+            expected -= 1
+    writer.close()
+    # 最後一個回覆是補送的 ping 的 pong
+    return replies[:-1] if not expected else replies
+
+
+async def _bench(address, count, rate):
+    """以每秒 rate 個指令的速度送出 count 個 angle 指令，最後查詢統計"""
+    reader, writer = await _session(address)
+    await _request(reader, writer, "ping")
+    before = json.loads(await _request(reader, writer, "stats"))
+
+    chunk = max(1, rate // 100)
+    start = time.perf_counter()
+    for sent in range(0, count, chunk):
+        size = min(chunk, count - sent)
+        writer.write("".join(f"angle tail_joint {(sent + i) % 90}\n" for i in range(size)).encode())
+        await writer.drain()
+        delay = start + (sent + size) / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    elapsed = time.perf_counter() - start
+    # 等最後一批指令被套用並畫完
+    while True:
+        after = json.loads(await _request(reader, writer, "stats"))
+        if after["applied"] >= before["received"] + count:
+            break
+        await asyncio.sleep(0.02)
+    writer.close()
+    return count / elapsed, after
+
+
+async def _request(reader, writer, line):
+    """送出 stats 或 ping 並回傳它的回覆，略過之前指令的錯誤回覆"""
+    writer.write((line + "\n").encode())
+    await writer.drain()
+    while True:
+        reply = (await reader.readline()).decode()
+        if not reply.startswith("error "):
+            return reply
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="機器人控制伺服器與客戶端")
+    parser.add_argument("command", choices=("serve", "bench", "send"))
+    parser.add_argument("lines", nargs="*", help="send 要送出的指令")
+    parser.add_argument("--port", default="8765", help="TCP 埠號或 Unix socket 路徑")
+    parser.add_argument("--seconds", type=float, help="serve 執行的秒數")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=5000, help="bench 每秒送出的指令數")
+    args = parser.parse_intermixed_args()
+
+    if args.command == "serve":
+        serve(args.port, args.seconds)
+    elif args.command == "send":
+        for reply in asyncio.run(_send(args.port, args.lines)):
+            print(reply)
+    else:
+        rate, stats = asyncio.run(_bench(args.port, args.count, args.rate))
+        print(f"送出 {args.count} 個指令（{rate:.0f} 個/秒），伺服器統計：{stats}")
+
+
+if __name__ == '__main__':
+    main()
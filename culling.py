@@ -0,0 +1,121 @@
+"""包圍盒階層與視錐剔除
+
+每個節點的局部包圍盒由它的網格頂點算出（Mesh.bounds）。BoundingHierarchy 沿用
+Kinematics 的前序陣列：先把局部包圍盒轉成世界座標，再由下往上合併成子樹包圍盒。
+關節角度改變時只需要重新 refit，不必重建階層。
+"""
+import numpy as np
+from components import Node
+
+
+def transform_bounds(lower, upper, matrices):
+    """(n, 3) 的局部 AABB 經 (n, 4, 4) 矩陣轉換後的世界 AABB"""
+    center = (lower + upper) * 0.5
+    extent = (upper - lower) * 0.5
+    rotation = matrices[:, :3, :3]
+    world_center = np.einsum("nij,nj->ni", rotation, center) + matrices[:, :3, 3]
+    world_extent = np.einsum("nij,nj->ni", np.abs(rotation), extent)
+    return world_center - world_extent, world_center + world_extent
+
+
+class Frustum:
+    """由投影矩陣 @ 視角矩陣取出的六個平面 (a, b, c, d)，法向量朝內"""
+    def __init__(self, matrix):
+        m = np.asarray(matrix, dtype=np.float64)
+        planes = np.array([
+            m[3] + m[0], m[3] - m[0],   # 左、右
+            m[3] + m[1], m[3] - m[1],   # 下、上
+            m[3] + m[2], m[3] - m[2],   # 近、遠
+        ])
+        self.planes = planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+    @classmethod
+    def from_camera(cls, camera):
+        return cls(camera.projection_matrix() @ camera.view_matrix())
+
+    def test(self, lower, upper):
+        """(n,) bool：包圍盒至少有一部分在視錐內"""
+        normals = self.planes[:, :3]
+        # 每個平面取法向量方向最遠的角點，它在平面外側就代表整個盒子在外側
+        farthest = np.where(normals[None] >= 0, upper[:, None], lower[:, None])
+        distance = np.einsum("npj,pj->np", farthest, normals) + self.planes[:, 3]
+        return (distance >= 0).all(axis=1)
+
+
+class BoundingHierarchy:
+    """依附在 kinematics.Kinematics 上的包圍盒階層"""
+    def __init__(self, kinematics):
+        self.kinematics = kinematics
+        self.stats = {"total": 0, "tested": 0, "drawn": 0, "culled_subtrees": 0}
+        self._bounds_key = None
+        self._refit_version = None
+
+    def _build(self):
+        """重新取得每個節點的局部包圍盒；沒有網格或不可見的節點 has_bounds 為 False"""
+        nodes = self.kinematics.nodes
+        n = len(nodes)
+        self.local_lower = np.zeros((n, 3))
+        self.local_upper = np.zeros((n, 3))
+        self.has_bounds = np.zeros(n, dtype=bool)
+        for i, node in enumerate(nodes):
+            bounds = node.local_bounds() if node.visible else None
+            if bounds is not None:
+                self.local_lower[i], self.local_upper[i] = bounds
+                self.has_bounds[i] = True
+        self.lower = np.zeros((n, 3))
+        self.upper = np.zeros((n, 3))
+        self.subtree_lower = np.zeros((n, 3))
+        self.subtree_upper = np.zeros((n, 3))
+
+    def refit(self):
+        """依目前的世界矩陣更新節點與子樹包圍盒，沒有變化時不做事"""
+        kinematics = self.kinematics
+        kinematics.update()
+        bounds_key = (kinematics.structure_version, Node.style_revision,
+                      tuple(node.visible for node in kinematics.nodes))
+        if bounds_key != self._bounds_key:
+            self._build()
+            self._bounds_key = bounds_key
+            self._refit_version = None
+        if self._refit_version == kinematics.version:
+            return
+        self._refit_version = kinematics.version
+
+        self.lower, self.upper = transform_bounds(self.local_lower, self.local_upper, kinematics.world)
+        # 沒有包圍盒的節點以空盒子 (+inf, -inf) 參與合併
+        lower = np.where(self.has_bounds[:, None], self.lower, np.inf)
+        upper = np.where(self.has_bounds[:, None], self.upper, -np.inf)
+        parents = kinematics.parents
+        for level in reversed(kinematics.levels[1:]):
+            np.minimum.at(lower, parents[level], lower[level])
+            np.maximum.at(upper, parents[level], upper[level])
+        self.subtree_lower, self.subtree_upper = lower, upper
+
+    def cull(self, frustum):
+        """回傳 (n,) bool，True 表示節點需要繪製；同時更新 stats
+
+        子樹包圍盒完全在視錐外時整個子樹都不必再測試。
+        """
+        self.refit()
+        kinematics = self.kinematics
+        parents = kinematics.parents
+        n = len(parents)
+        subtree_empty = ~np.isfinite(self.subtree_lower[:, 0])
+        empty = subtree_empty[:, None]
+        subtree_inside = frustum.test(np.where(empty, 0, self.subtree_lower),
+                                      np.where(empty, 0, self.subtree_upper)) & ~subtree_empty
+
+        # 祖先的子樹被剔除時，這個節點不會被測試到
+        reached = np.ones(n, dtype=bool)
+        for level in kinematics.levels[1:]:
+            reached[level] = reached[parents[level]] & subtree_inside[parents[level]]
+        own_inside = frustum.test(self.lower, self.upper)
+        draw = reached & subtree_inside & self.has_bounds & own_inside
+
+        self.stats = {
+            "total": n,
+            "tested": int(reached.sum()),
+            "drawn": int(draw.sum()),
+            "culled_subtrees": int((reached & ~subtree_inside & ~subtree_empty).sum()),
+        }
+        return draw
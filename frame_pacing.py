@@ -0,0 +1,98 @@
+"""畫面節奏與輸入延遲量測
+
+FramePacer 讓主迴圈對準固定的截止時間，而不是每幀固定多睡一段時間：
+這一幀花掉的時間會從等待中扣掉，落後超過一幀時直接從現在重新對齊。
+
+InputLatency 在主迴圈取得輸入事件時記下時間，畫面送出（flip）後計算每個事件從
+被取得到畫面送出的時間。還沒重畫的事件會一直保留到下一次送出畫面，主迴圈進入
+閒置時才丟掉（discard）。pygame 的事件沒有時間戳記，所以不包含事件在 SDL
+佇列中等待的時間（最多一幀）。
+"""
+import time
+import numpy as np
+
+
+class LatencyWindow:
+    """最近 size 筆延遲（秒）的環狀緩衝區"""
+    def __init__(self, size=8192):
+        self.values = np.zeros(size)
+        self.count = 0
+
+    def extend(self, values):
+        values = np.asarray(values)[-len(self.values):]
+        start = self.count % len(self.values)
+        end = start + len(values)
+        if end <= len(self.values):
+            self.values[start:end] = values
+        else:
+            split = len(self.values) - start
+            self.values[start:] = values[:split]
+            self.values[:end - len(self.values)] = values[split:]
+        self.count += len(values)
+
+    def percentiles(self, q=(50, 99)):
+        """毫秒；還沒有資料時為 None"""
+        if self.count == 0:
+            return None
+        values = self.values[:min(self.count, len(self.values))]
+        return [float(v) * 1000 for v in np.percentile(values, q)]
+
+
+class FramePacer:
+    """以截止時間控制幀率"""
+    def __init__(self, fps=60):
+        self.frame_time = 1.0 / fps
+        self.deadline = None
+        self.late = 0
+
+    def reset(self):
+        """閒置等待事件之後，從現在重新開始計算截止時間"""
+        self.deadline = None
+
+    def wait(self):
+        """睡到下一個截止時間；已經超過時不睡，並記錄一次落後"""
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += self.frame_time
+        remaining = self.deadline - now
+        if remaining > 0:
+            time.sleep(remaining)
+        else:
+            self.late += 1
+            if remaining < -self.frame_time:
+                # 落後超過一幀就不追了，避免之後連續好幾幀都不等待
+                self.deadline = now
+
+
+class InputLatency:
+    """輸入事件到畫面送出的延遲"""
+    def __init__(self, size=8192):
+        self.window = LatencyWindow(size)
+        self.events = 0
+        self._pending = []
+
+    def mark(self, count=1, now=None):
+        """主迴圈取得 count 個輸入事件"""
+        if now is None:
+            now = time.perf_counter()
+        self._pending.append((now, count))
+
+    def presented(self, now=None):
+        """畫面送出後呼叫，之前記下的事件都已經反映在畫面上"""
+        if not self._pending:
+            return
+        if now is None:
+            now = time.perf_counter()
+        times = np.array([t for t, _ in self._pending])
+        counts = np.array([count for _, count in self._pending])
+        self.window.extend(np.repeat(now - times, counts))
+        self.events += int(counts.sum())
+        self._pending = []
+
+    def discard(self):
+        """主迴圈要閒置等待了，記下的事件不會再反映到畫面上，丟掉"""
+        self._pending = []
+
+    def percentiles(self, q=(50, 99)):
+        return self.window.percentiles(q)
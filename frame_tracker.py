@@ -0,0 +1,23 @@
+class FrameTracker:
+    """比較每一幀的場景狀態，沒有變化就跳過重畫"""
+    def __init__(self):
+        self.rendered = 0
+        self.skipped = 0
+        self._last_signature = None
+        self._force = True
+
+    def invalidate(self):
+        """視窗事件（曝光、縮放等）後強制重畫一次"""
+        self._force = True
+
+    def should_render(self, signature):
+        if self._force or signature != self._last_signature:
+            self._force = False
+            self._last_signature = signature
+            self.rendered += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {"rendered": self.rendered, "skipped": self.skipped}
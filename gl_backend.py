@@ -0,0 +1,242 @@
+from OpenGL.GL import *
+from OpenGL.GLU import *
+import numpy as np
+from components import Node, has_outline
+from kinematics import rigid_groups, group_relative_matrices
+
+# 依繪製模式共用 quadric，避免每幀 gluNewQuadric/gluDeleteQuadric
+_quadrics = {}
+
+def get_quadric(draw_style):
+    if draw_style not in _quadrics:
+        quadric = gluNewQuadric()
+        gluQuadricDrawStyle(quadric, draw_style)
+        _quadrics[draw_style] = quadric
+    return _quadrics[draw_style]
+
+
+class GLCanvas:
+    """以固定管線 OpenGL 實作節點的繪圖介面"""
+    def push_transform(self, translation, rotation):
+        glPushMatrix()
+        # 先進行平移和旋轉
+        glTranslatef(*translation)
+        if rotation[0] != 0:
+            glRotatef(*rotation)
+
+    def push_matrix(self, matrix):
+        """matrix 為 column-major 的 4x4 矩陣"""
+        glPushMatrix()
+        glMultMatrixf(matrix)
+
+    def pop_transform(self):
+        glPopMatrix()
+
+    def draw_mesh(self, mesh, color, fill, wireframe_color):
+        """用頂點陣列一次送出整個網格（多邊形模式一律為 GL_FILL，不必每個節點設定）"""
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, mesh.vertices)
+        if fill:
+            glColor3f(*color)
+            glDrawElements(GL_TRIANGLES, mesh.triangles.size, GL_UNSIGNED_INT, mesh.triangles)
+
+        # 繪製黑色邊框
+        glColor3f(*wireframe_color)
+        glDrawElements(GL_LINES, mesh.edges.size, GL_UNSIGNED_INT, mesh.edges)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def draw_sphere(self, radius, slices, stacks, color, fill, wireframe_color):
+        if fill:
+            glColor3f(*color)
+            gluSphere(get_quadric(GLU_FILL), radius, slices, stacks)
+        else:
+            glColor3f(*wireframe_color)
+            gluSphere(get_quadric(GLU_LINE), radius, slices, stacks)
+
+
+class FillCanvas(GLCanvas):
+    """只畫實心的部分，邊框由 EdgeBatch 一次畫完"""
+    def draw_mesh(self, mesh, color, fill, wireframe_color):
+        if not fill:
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, mesh.vertices)
+        glColor3f(*color)
+        glDrawElements(GL_TRIANGLES, mesh.triangles.size, GL_UNSIGNED_INT, mesh.triangles)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def draw_sphere(self, radius, slices, stacks, color, fill, wireframe_color):
+        if fill:
+            glColor3f(*color)
+            gluSphere(get_quadric(GLU_FILL), radius, slices, stacks)
+
+
+class EdgeBatch:
+    """所有零件的邊框合併成一個頂點陣列與線段索引，一次 GL_LINES 畫完
+
+    網格的局部頂點只在結構或樣式改變時收集一次；關節轉動後在 CPU 上一次把所有頂點
+    轉到世界座標。線框顏色 Node.wireframe_color 只是每幀一次的 glColor。
+    """
+    def __init__(self):
+        self.vertices = np.zeros((0, 3), dtype=np.float32)
+        self.edges = np.zeros(0, dtype=np.uint32)
+        self._key = None
+        self._version = None
+
+    def _build(self, kinematics):
+        local, owners, edges, edge_owners = [], [], [], []
+        count = 0
+        for i, node in enumerate(kinematics.nodes):
+            mesh = node.get_mesh() if has_outline(node) else None
+            if mesh is None or mesh.edges.size == 0:
+                continue
+            local.append(mesh.vertices)
+            owners.append(np.full(len(mesh.vertices), i, dtype=np.intp))
+            edges.append(mesh.edges + np.uint32(count))
+            edge_owners.append(np.full(mesh.edges.size // 2, i, dtype=np.intp))
+            count += len(mesh.vertices)
+        if count:
+            self.local = np.concatenate(local).astype(np.float64)
+            self.owners = np.concatenate(owners)
+            self.edges = np.concatenate(edges)
+            self.edge_owners = np.concatenate(edge_owners)
+        else:
+            self.local = np.zeros((0, 3))
+            self.owners = np.zeros(0, dtype=np.intp)
+            self.edges = np.zeros(0, dtype=np.uint32)
+            self.edge_owners = np.zeros(0, dtype=np.intp)
+        self.vertices = np.zeros((count, 3), dtype=np.float32)
+
+    def update(self, kinematics):
+        kinematics.update()
+        key = (id(kinematics), kinematics.structure_version, Node.style_revision,
+               tuple(node.visible for node in kinematics.nodes))
+        if key != self._key:
+            self._build(kinematics)
+            self._key = key
+            self._version = None
+        if self._version == kinematics.version:
+            return
+        self._version = kinematics.version
+        world = kinematics.world[self.owners]
+        self.vertices[:] = np.einsum("nij,nj->ni", world[:, :3, :3], self.local) + world[:, :3, 3]
+
+    def draw(self, kinematics, draw=None):
+        """draw 為每個節點是否需要繪製，被剔除的節點的線段不送出"""
+        self.update(kinematics)
+        edges = self.edges
+        if draw is not None and edges.size:
+            visible = draw[self.edge_owners]
+            if not visible.all():
+                edges = np.ascontiguousarray(edges.reshape(-1, 2)[visible]).ravel()
+        if edges.size == 0:
+            return
+        # 頂點已經是世界座標，只套用相機矩陣
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, self.vertices)
+        glColor3f(*Node.wireframe_color)
+        glDrawElements(GL_LINES, edges.size, GL_UNSIGNED_INT, edges)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+
+class StaticGroup:
+    """一段不跨越 Joint 的子樹，編譯成一個 display list"""
+    def __init__(self, root, members):
+        self.root = root
+        # 第一個為 root，其餘依前序排列
+        self.members = members
+        self.indices = np.array(members, dtype=np.intp)
+        self.list_id = None
+        self.compiled_key = None
+
+    def key(self, nodes, fill_only=False):
+        """root 的變換由 Joint 即時套用，不影響 display list；只畫實心時與線框顏色無關"""
+        root = nodes[self.root]
+        return ((root.style_version, root.visible, fill_only or Node.wireframe_color)
+                + tuple((nodes[i].version, nodes[i].visible) for i in self.members[1:]))
+
+    def compile(self, kinematics, canvas, fill_only=False):
+        """以 root 為原點記錄所有成員的繪製；沒有任何東西可畫時 empty 為 True"""
+        nodes = kinematics.nodes
+        relative = group_relative_matrices(kinematics, self.members)
+        if self.list_id is None:
+            self.list_id = glGenLists(1)
+        self.empty = True
+        glNewList(self.list_id, GL_COMPILE)
+        for i in self.members:
+            node = nodes[i]
+            if node.visible and (node.fill or not fill_only):
+                canvas.push_matrix(np.ascontiguousarray(relative[i].T, dtype=np.float32))
+                node.draw(canvas)
+                canvas.pop_transform()
+                self.empty = False
+        glEndList()
+
+    def delete(self):
+        if self.list_id is not None:
+            glDeleteLists(self.list_id, 1)
+            self.list_id = None
+
+
+class DisplayListCache:
+    """把靜態子樹快取成 display list，只有子樹內部改變時才重新編譯
+
+    Joint 的角度只改變子樹 root 的變換，每幀即時套用，不需要重新編譯。
+    batch_edges 為 True 時 display list 只包含實心的三角形，所有零件的邊框
+    由 EdgeBatch 最後一次畫完；線框模式下整台機器人只有一次繪製。
+    """
+    def __init__(self, batch_edges=True):
+        self.groups = []
+        self.compiles = 0
+        self.batch_edges = batch_edges
+        self.fill_canvas = FillCanvas()
+        self.edge_batch = EdgeBatch()
+        self._structure = None
+
+    def _build_groups(self, kinematics):
+        for group in self.groups:
+            group.delete()
+        groups = rigid_groups(kinematics)
+        self.groups = [StaticGroup(root, members) for root, members in groups.items()]
+        self._structure = (id(kinematics), kinematics.structure_version)
+
+    def render(self, kinematics, canvas, draw=None, profiler=None):
+        """draw 為每個節點是否需要繪製（視錐剔除的結果），整組都不需要時跳過
+
+        profiler（profiler.FrameProfiler）不為 None 時，每個群組以 root 節點的名稱、
+        邊框以 "edges" 分別計時。
+        """
+        kinematics.update()
+        if self._structure != (id(kinematics), kinematics.structure_version):
+            self._build_groups(kinematics)
+
+        nodes = kinematics.nodes
+        fill_only = self.batch_edges
+        if fill_only:
+            canvas = self.fill_canvas
+        for group in self.groups:
+            if draw is not None and not draw[group.indices].any():
+                continue
+            if profiler is None:
+                self._render_group(kinematics, canvas, group, fill_only)
+            else:
+                profiler.measure(nodes[group.root].name, self._render_group, kinematics, canvas, group, fill_only)
+
+        if fill_only:
+            if profiler is None:
+                self.edge_batch.draw(kinematics, draw)
+            else:
+                profiler.measure("edges", self.edge_batch.draw, kinematics, draw)
+
+    def _render_group(self, kinematics, canvas, group, fill_only):
+        key = group.key(kinematics.nodes, fill_only)
+        if key != group.compiled_key:
+            group.compile(kinematics, canvas, fill_only)
+            group.compiled_key = key
+            self.compiles += 1
+        if group.empty:
+            return
+        glPushMatrix()
+        glMultMatrixf(kinematics.gl_world[group.root])
+        glCallList(group.list_id)
+        glPopMatrix()
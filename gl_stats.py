@@ -0,0 +1,54 @@
+"""統計 OpenGL 呼叫次數
+
+把使用 `from OpenGL.GL import *` 的模組中的 gl*/glu* 函式換成計數用的包裝。
+passthrough=False 時完全不呼叫真正的 OpenGL，可在沒有 context 的環境下執行。
+"""
+from collections import Counter
+import importlib
+
+
+DEFAULT_MODULES = ("gl_backend", "RobotView")
+
+
+class GLCallCounter:
+    def __init__(self, modules=DEFAULT_MODULES, passthrough=True):
+        self.modules = [importlib.import_module(name) for name in modules]
+        self.passthrough = passthrough
+        self.counts = Counter()
+        self._originals = []
+
+    def _wrap(self, name, function):
+        counts = self.counts
+        if self.passthrough:
+            def wrapper(*args, **kwargs):
+                counts[name] += 1
+                return function(*args, **kwargs)
+        else:
+            def wrapper(*args, **kwargs):
+                counts[name] += 1
+        return wrapper
+
+    def install(self):
+        for module in self.modules:
+            for name, value in list(vars(module).items()):
+                if name.startswith("gl") and callable(value) and not isinstance(value, type):
+                    self._originals.append((module, name, value))
+                    setattr(module, name, self._wrap(name, value))
+        return self
+
+    def uninstall(self):
+        for module, name, value in reversed(self._originals):
+            setattr(module, name, value)
+        self._originals = []
+
+    def reset(self):
+        self.counts.clear()
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
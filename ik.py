@@ -0,0 +1,215 @@
+"""關節鏈的反向運動學（damped least squares，可一次解大量目標）
+
+    python ik.py left_hand            # 量測左手的可達範圍
+
+Joint.set_angle 會同時設定關節自己與直接子節點的旋轉，所以正向運動學沿著
+從 Kinematics 根節點到末端節點的路徑逐節點相乘：路徑上的 Joint 使用自己的角度，
+父節點是 Joint 的節點使用父關節的角度，其餘節點使用目前的局部矩陣。
+Jacobian 以有限差分計算，和繪製用的模型完全一致。
+"""
+import sys
+import time
+import numpy as np
+from components import Joint
+from kinematics import rotation_matrices
+
+
+class IKChain:
+    """從 kinematics 根節點到 end 的關節鏈
+
+    point 為末端節點局部座標中的目標點，預設為網格包圍盒的中心。
+    """
+    def __init__(self, kinematics, end, point=None):
+        kinematics.update()
+        self.kinematics = kinematics
+        self.end = end
+
+        path = []
+        node = end
+        while node is not None:
+            path.append(node)
+            if node is kinematics.root:
+                break
+            node = node.parent
+        if path[-1] is not kinematics.root:
+            raise ValueError(f"{end.name} 不在這個 Kinematics 底下")
+        path.reverse()
+
+        joints, drivers = [], []
+        for node in path:
+            if isinstance(node, Joint):
+                driver = node
+            elif isinstance(node.parent, Joint):
+                driver = node.parent
+            else:
+                driver = None
+            if driver is not None and driver not in joints:
+                joints.append(driver)
+            drivers.append(-1 if driver is None else joints.index(driver))
+
+        self.path = path
+        self.joints = joints
+        self.drivers = drivers
+        self.local = kinematics.local[[node.kinematics_index for node in path]].copy()
+        self.translations = np.array([node.translation for node in path], dtype=np.float64)
+        self.axes = np.array([joint.axis for joint in joints], dtype=np.float64)
+        self.lower = np.array([joint.min_angle for joint in joints], dtype=np.float64)
+        self.upper = np.array([joint.max_angle for joint in joints], dtype=np.float64)
+
+        if point is None:
+            bounds = end.local_bounds()
+            point = (0, 0, 0) if bounds is None else (bounds[0] + bounds[1]) / 2
+        self.point = np.append(np.asarray(point, dtype=np.float64), 1.0)
+
+    def angles(self):
+        """目前的關節角度 (m,)"""
+        return np.array([joint.angle for joint in self.joints], dtype=np.float64)
+
+    def forward(self, angles):
+        """(B, m) 組角度的末端世界座標 (B, 3)"""
+        angles = np.atleast_2d(np.asarray(angles, dtype=np.float64))
+        count = len(angles)
+        rotations = []
+        for j, axis in enumerate(self.axes):
+            rows = np.empty((count, 4))
+            rows[:, 0] = angles[:, j]
+            rows[:, 1:] = axis
+            rotations.append(rotation_matrices(rows))
+
+        matrix = None
+        for i, driver in enumerate(self.drivers):
+            if driver < 0:
+                local = self.local[i]
+            else:
+                local = rotations[driver].copy()
+                local[:, :3, 3] = self.translations[i]
+            matrix = np.broadcast_to(local, (count, 4, 4)) if matrix is None else matrix @ local
+        return (matrix @ self.point)[:, :3]
+
+    def jacobian(self, angles, epsilon=1e-4):
+        """有限差分 Jacobian (B, 3, m)，角度單位為度"""
+        base = self.forward(angles)
+        columns = []
+        for j in range(len(self.joints)):
+            shifted = angles.copy()
+            shifted[:, j] += epsilon
+            columns.append((self.forward(shifted) - base) / epsilon)
+        return base, np.stack(columns, axis=2)
+
+    def solve(self, targets, initial=None, iterations=100, tolerance=1e-3, damping=0.05, patience=5):
+        """對 (B, 3) 個目標同時求解，回傳 (角度 (B, m), 誤差距離 (B,))
+
+        每一步 Δθ = Jᵀ (J Jᵀ + λ²I)⁻¹ e，之後夾在各關節的角度範圍內。已經在角度限制上、
+        這一步又要往外轉的關節，把它的 Jacobian 欄設為 0 再解一次，由其他關節補上。
+        已收斂，或連續 patience 步誤差都沒有下降的目標會提早移出計算；
+        回傳的是每個目標誤差最小時的角度，不是最後一步的角度。
+        """
+        targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+        count = len(targets)
+        if initial is None:
+            initial = self.angles()
+        angles = np.array(np.broadcast_to(initial, (count, len(self.joints))), dtype=np.float64)
+        # 以弧度計算步長，讓 damping 與長度單位相當
+        scale = np.pi / 180
+        identity = np.eye(3) * damping ** 2
+
+        def step(jac, error):
+            jjt = jac @ jac.transpose(0, 2, 1) + identity
+            return (jac.transpose(0, 2, 1) @ np.linalg.solve(jjt, error[:, :, None]))[:, :, 0]
+
+        best = angles.copy()
+        errors = np.full(count, np.inf)
+        stalls = np.zeros(count, dtype=np.intp)
+        active = np.arange(count)
+        for _ in range(iterations):
+            position, jac = self.jacobian(angles[active])
+            error = targets[active] - position
+            distance = np.linalg.norm(error, axis=1)
+            improved = distance < errors[active] - tolerance * 1e-3
+            better = distance < errors[active]
+            best[active[better]] = angles[active[better]]
+            errors[active[better]] = distance[better]
+            stalls[active] = np.where(improved, 0, stalls[active] + 1)
+            keep = (distance > tolerance) & (stalls[active] < patience)
+            active, error, jac = active[keep], error[keep], jac[keep]
+            if active.size == 0:
+                break
+            jac = jac / scale
+            current = angles[active]
+            delta = step(jac, error)
+            blocked = ((current <= self.lower) & (delta < 0)) | ((current >= self.upper) & (delta > 0))
+            if blocked.any():
+                delta = step(jac * ~blocked[:, None, :], error)
+            angles[active] = np.clip(current + delta / scale, self.lower, self.upper)
+        if active.size:
+            distance = np.linalg.norm(targets[active] - self.forward(angles[active]), axis=1)
+            better = distance < errors[active]
+            best[active[better]] = angles[active[better]]
+            errors[active[better]] = distance[better]
+        return best, errors
+
+    def apply(self, angles, robot=None):
+        """把一組解 (m,) 設定到關節上；給了 robot 就一併重算 step 與 state"""
+        for joint, angle in zip(self.joints, angles):
+            joint.set_angle(float(angle))
+        if robot is not None:
+            robot.sync_steps()
+
+
+def solve(robot, end, target, **options):
+    """讓 robot 的 end 節點移到 target，回傳誤差距離"""
+    chain = IKChain(robot.kinematics, end)
+    angles, errors = chain.solve(target, **options)
+    chain.apply(angles[0], robot)
+    return float(errors[0])
+
+
+def sample_workspace(chain, count=10000, seed=0):
+    """在角度範圍內隨機取樣，回傳 (角度, 末端位置)"""
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(chain.lower, chain.upper, size=(count, len(chain.joints)))
+    return angles, chain.forward(angles)
+
+
+def reachability(chain, targets, tolerance=1e-2, restarts=3, seed=0, **options):
+    """每個目標是否可達 (bool)、誤差與解出的角度
+
+    從目前姿勢解不到的目標，再從隨機的起始角度重試 restarts 次，避開局部極小值。
+    """
+    targets = np.atleast_2d(np.asarray(targets, dtype=np.float64))
+    angles, errors = chain.solve(targets, tolerance=tolerance * 0.1, **options)
+    rng = np.random.default_rng(seed)
+    for _ in range(restarts):
+        failed = np.flatnonzero(errors > tolerance)
+        if failed.size == 0:
+            break
+        initial = rng.uniform(chain.lower, chain.upper, size=(failed.size, len(chain.joints)))
+        retry, retry_errors = chain.solve(targets[failed], initial=initial, tolerance=tolerance * 0.1, **options)
+        better = retry_errors < errors[failed]
+        angles[failed[better]] = retry[better]
+        errors[failed[better]] = retry_errors[better]
+    return errors <= tolerance, errors, angles
+
+
+def main():
+    from robot import Robot
+    name = sys.argv[1] if len(sys.argv) > 1 else "left_hand"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    robot = Robot(create_view=False)
+    chain = IKChain(robot.kinematics, robot.nodes[name])
+    print(f"{name}: {' -> '.join(joint.name for joint in chain.joints)}")
+
+    # 一半取自可達空間，一半為附近的隨機點
+    _, reachable = sample_workspace(chain, count // 2)
+    rng = np.random.default_rng(1)
+    low, high = reachable.min(axis=0) - 1, reachable.max(axis=0) + 1
+    targets = np.concatenate([reachable, rng.uniform(low, high, size=(count - count // 2, 3))])
+
+    start = time.perf_counter()
+    ok, errors, _ = reachability(chain, targets)
+    elapsed = time.perf_counter() - start
+    print(f"{count} 個目標 {elapsed:.2f} 秒，可達 {ok.sum()}（取樣自可達空間的 {ok[:count // 2].mean():.1%} 收斂）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import numpy as np
+from components import Joint
+
+
+def rotation_matrices(rotations):
+    """(n, 4) 的 (angle, x, y, z) 轉成 (n, 4, 4) 旋轉矩陣，與 glRotatef 相同"""
+    rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 4)
+    angle = np.radians(rotations[:, 0])
+    axis = rotations[:, 1:]
+    norm = np.linalg.norm(axis, axis=1)
+    # 角度為 0 或軸為零向量時當作單位矩陣
+    valid = (norm > 0) & (angle != 0)
+    axis = np.where(valid[:, None], axis / np.where(norm > 0, norm, 1)[:, None], 0)
+    x, y, z = axis[:, 0], axis[:, 1], axis[:, 2]
+    c = np.where(valid, np.cos(angle), 1)
+    s = np.where(valid, np.sin(angle), 0)
+    t = 1 - c
+
+    m = np.zeros((len(rotations), 4, 4))
+    m[:, 0, 0] = t * x * x + c
+    m[:, 0, 1] = t * x * y - s * z
+    m[:, 0, 2] = t * x * z + s * y
+    m[:, 1, 0] = t * x * y + s * z
+    m[:, 1, 1] = t * y * y + c
+    m[:, 1, 2] = t * y * z - s * x
+    m[:, 2, 0] = t * x * z - s * y
+    m[:, 2, 1] = t * y * z + s * x
+    m[:, 2, 2] = t * z * z + c
+    m[:, 3, 3] = 1
+    return m
+
+
+def local_matrices(translations, rotations):
+    """平移後再旋轉，等同 glTranslatef + glRotatef"""
+    m = rotation_matrices(rotations)
+    m[:, :3, 3] = np.asarray(translations, dtype=np.float64).reshape(-1, 3)
+    return m
+
+
+class Kinematics:
+    """把 Node 樹攤平成 parent 索引陣列，一次算出所有節點的世界矩陣
+
+    節點以前序排列，所以節點 i 的子樹就是 [i, subtree_end[i])。
+    Node.set_translation / set_rotation 會呼叫 mark_dirty，
+    update() 只重算被標記的子樹。
+    """
+    def __init__(self, root):
+        self.root = root
+        self.version = 0
+        self.structure_version = 0
+        self.rebuild()
+
+    def rebuild(self):
+        """重新攤平整棵樹（結構改變時使用）"""
+        nodes, parents, depths = [], [], []
+        stack = [(self.root, -1, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            index = len(nodes)
+            nodes.append(node)
+            parents.append(parent)
+            depths.append(depth)
+            node.kinematics = self
+            node.kinematics_index = index
+            for child in reversed(node.children):
+                stack.append((child, index, depth + 1))
+
+        n = len(nodes)
+        self.nodes = nodes
+        self.parents = np.array(parents, dtype=np.int32)
+        self.depths = np.array(depths, dtype=np.int32)
+        self.subtree_end = np.arange(1, n + 1, dtype=np.int32)
+        for i in range(n - 1, 0, -1):
+            p = parents[i]
+            self.subtree_end[p] = max(self.subtree_end[p], self.subtree_end[i])
+        self.levels = [np.flatnonzero(self.depths == d) for d in range(self.depths.max() + 1)]
+
+        self.local = np.tile(np.eye(4), (n, 1, 1))
+        self.world = np.tile(np.eye(4), (n, 1, 1))
+        self.gl_world = np.zeros((n, 4, 4), dtype=np.float32)
+        self.local_dirty = np.ones(n, dtype=bool)
+        self.world_dirty = np.ones(n, dtype=bool)
+        self.structure_dirty = False
+        self.version += 1
+        self.structure_version += 1
+
+    def mark_dirty(self, node):
+        i = node.kinematics_index
+        self.local_dirty[i] = True
+        self.world_dirty[i:self.subtree_end[i]] = True
+        self.version += 1
+
+    def invalidate(self):
+        """樹的結構改變了，下次 update 時重新攤平"""
+        self.structure_dirty = True
+        self.version += 1
+
+    def update(self):
+        """重算被標記的局部與世界矩陣，沒有變化時回傳 False"""
+        if self.structure_dirty:
+            self.rebuild()
+        if not self.world_dirty.any():
+            return False
+
+        changed = np.flatnonzero(self.local_dirty)
+        if changed.size:
+            nodes = [self.nodes[i] for i in changed]
+            self.local[changed] = local_matrices(
+                [node.translation for node in nodes],
+                [node.rotation for node in nodes])
+            self.local_dirty[changed] = False
+
+        for level in self.levels:
+            dirty = level[self.world_dirty[level]]
+            if dirty.size == 0:
+                continue
+            parents = self.parents[dirty]
+            if parents[0] < 0:
+                self.world[dirty] = self.local[dirty]
+            else:
+                self.world[dirty] = self.world[parents] @ self.local[dirty]
+
+        dirty = np.flatnonzero(self.world_dirty)
+        # OpenGL 使用 column-major
+        self.gl_world[dirty] = self.world[dirty].transpose(0, 2, 1)
+        self.world_dirty[:] = False
+        return True
+
+    def world_matrix(self, node):
+        self.update()
+        return self.world[node.kinematics_index]
+
+    def world_position(self, node, point=(0, 0, 0)):
+        """節點局部座標 point 在世界座標中的位置"""
+        m = self.world_matrix(node)
+        return m[:3, :3] @ np.asarray(point, dtype=np.float64) + m[:3, 3]
+
+    def world_positions(self):
+        """所有節點原點的世界座標，形狀 (n, 3)"""
+        self.update()
+        return self.world[:, :3, 3].copy()
+
+    def drawables(self):
+        """(node, column-major 世界矩陣) ，只包含可見節點"""
+        self.update()
+        return [(node, self.gl_world[i]) for i, node in enumerate(self.nodes) if node.visible]
+
+
+def rigid_groups(kinematics):
+    """把節點分成一起移動的群組 {root: [root, 成員...]}，成員依前序排列
+
+    Joint 自己與其直接子節點都會隨角度轉動，各自開一個群組，
+    其餘節點跟著父節點所在的群組。
+    """
+    nodes, parents = kinematics.nodes, kinematics.parents
+    group_of = {}
+    groups = {}
+    for i, node in enumerate(nodes):
+        parent = parents[i]
+        if parent < 0 or isinstance(node, Joint) or isinstance(nodes[parent], Joint):
+            group_of[i] = i
+            groups[i] = [i]
+        else:
+            group_of[i] = group_of[parent]
+            groups[group_of[i]].append(i)
+    return groups
+
+
+def group_relative_matrices(kinematics, members):
+    """群組成員相對於群組 root（members[0]）的矩陣"""
+    relative = {members[0]: np.eye(4)}
+    for i in members[1:]:
+        relative[i] = relative[kinematics.parents[i]] @ kinematics.local[i]
+    return relative
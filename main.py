@@ -3,21 +3,52 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from robot import Robot
+from components import Node
+from frame_tracker import FrameTracker
+from simulation import Simulation
+from profiler import FrameProfiler, ProfilerHUD
+from picking import Picker, screen_ray
+from pose_log import PoseRecorder, PoseLog, PosePlayer
+from control import ControlServer
+from frame_pacing import FramePacer, InputLatency
 import sys
+import time
+
+# 計算輸入延遲的事件
+INPUT_EVENTS = (
+    pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP,
+    pygame.MOUSEMOTION, pygame.MOUSEWHEEL,
+)
+
+# 依序控制 Robot.key_joints 的按鍵
+JOINT_KEYS = (pygame.K_z, pygame.K_x, pygame.K_c, pygame.K_v, pygame.K_b, pygame.K_n, pygame.K_m)
+
+# 控制伺服器收到指令時喚醒主迴圈
+CONTROL_EVENT = pygame.USEREVENT + 1
+
+# 這些視窗事件發生後畫面內容可能遺失，需要重畫
+WINDOW_EVENTS = (
+    pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.ACTIVEEVENT,
+    pygame.WINDOWEXPOSED, pygame.WINDOWRESIZED, pygame.WINDOWRESTORED, pygame.WINDOWSHOWN,
+)
 
 class Application:
-    def __init__(self, width=1000, height=1000):
+    def __init__(self, width=1000, height=1000, scene_path=None, control_address=None):
         # 初始化Pygame
         pygame.init()
         pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL)
         pygame.display.set_caption("Robot Arm Simulation")
+        self.width = width
+        self.height = height
         
         # 創建機器人實例
-        self.robot = Robot()
+        # scene_path 為宣告式描述檔（見 scene_file.py），省略時使用內建的機器人
+        self.robot = Robot(scene_path=scene_path)
         
         # 控制器相關屬性
         self.mouse_pressed = False
-        self.last_mouse_pos = None
+        # 這一幀拖曳累積的滑鼠位移，處理完所有事件後一次更新視角
+        self.drag = [0, 0]
         self.keys_pressed = {
             pygame.K_z: False,
             pygame.K_x: False,
@@ -25,6 +56,7 @@ class Application:
             pygame.K_v: False,
             pygame.K_b: False,
             pygame.K_n: False,
+            pygame.K_m: False,
             pygame.K_a: False,
             
             pygame.K_LEFT: False,
@@ -33,15 +65,49 @@ class Application:
             pygame.K_DOWN: False
         }
         
-        # 添加新的控制變數
-        self.auto_stepping = False
-        self.step_count = 0
+        # 關節動畫以固定頻率模擬，與畫面更新率無關
+        self.simulation = Simulation(self.robot)
+        # z x c v b n m 依序控制 Robot.key_joints（場景描述檔的 "keys"）
+        self.joint_keys = dict(zip(JOINT_KEYS, self.robot.key_joints))
+        self.last_time = time.perf_counter()
+
+        # 右鍵點選零件，滾輪轉動帶動它的關節
+        self.picker = Picker(self.robot.kinematics)
+        self.selected_joint = None
+        self.wheel_step = 5
+
+        # F5 開始／停止錄製，F6 重播；重播時 , . 前後跳一秒，/ 反向，- = 調整速度
+        self.log_path = "session.poselog"
+        self.replay = None
+
+        # 其他程序透過 control.py 的協定控制機器人
+        self.control = None
+        if control_address is not None:
+            self.control = ControlServer(self.robot, control_address, camera=self.robot.view,
+                                         wake=lambda: pygame.event.post(pygame.event.Event(CONTROL_EVENT)))
+            self.simulation.control = self.control.start()
+
+        # 畫面沒有變化時不重畫
+        self.frames = FrameTracker()
+        # 對準 60 fps 的截止時間；記錄輸入事件到畫面送出的延遲
+        self.pacer = FramePacer(60)
+        self.input_latency = InputLatency()
+
+        # F3 開關效能分析與疊加資訊，F4 輸出 Chrome trace
+        self.profiler = FrameProfiler()
+        self.robot.view.profiler = self.profiler
+        self.robot.view.viewport_height = height
     
     def handle_mouse_events(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 1:  # 左鍵按下
                 self.mouse_pressed = True
-                self.last_mouse_pos = pygame.mouse.get_pos()
+            elif event.button == 3:  # 右鍵點選
+                self.select(*event.pos)
+
+        elif event.type == pygame.MOUSEWHEEL:
+            if self.selected_joint is not None:
+                self.simulation.nudge(self.selected_joint, event.y * self.wheel_step)
                 
         elif event.type == pygame.MOUSEBUTTONUP:
             if event.button == 1:  # 左鍵釋放
@@ -49,21 +115,31 @@ class Application:
                 
         elif event.type == pygame.MOUSEMOTION:
             if self.mouse_pressed:
-                current_pos = pygame.mouse.get_pos()
-                if self.last_mouse_pos:
-                    # 計算滑鼠移動距離
-                    dx = current_pos[0] - self.last_mouse_pos[0]
-                    dy = current_pos[1] - self.last_mouse_pos[1]
-                    
-                    # 更新視角旋轉
-                    self.robot.view.view_rot_y += dx * 0.5
-                    self.robot.view.view_rot_x += dy * 0.5
-                    
-                    # 限制x軸旋轉範圍
-                    self.robot.view.view_rot_x = max(-90, min(90, self.robot.view.view_rot_x))
-                
-                self.last_mouse_pos = current_pos
+                self.drag[0] += event.rel[0]
+                self.drag[1] += event.rel[1]
+
+    def apply_drag(self):
+        """把這一幀累積的拖曳位移一次套用到視角"""
+        dx, dy = self.drag
+        if dx == 0 and dy == 0:
+            return
+        self.drag = [0, 0]
+        view = self.robot.view
+        view.view_rot_y += dx * 0.5
+        # 限制x軸旋轉範圍
+        view.view_rot_x = max(-90, min(90, view.view_rot_x + dy * 0.5))
     
+    def select(self, x, y):
+        """以滑鼠位置的射線挑選零件，選取帶動它的關節"""
+        origin, direction = screen_ray(self.robot.view, x, y, self.width, self.height)
+        result = self.picker.pick(origin, direction)
+        joint = result.joint if result is not None else None
+        self.selected_joint = joint
+        if joint is None:
+            pygame.display.set_caption("Robot Arm Simulation")
+        else:
+            pygame.display.set_caption(f"Robot Arm Simulation - {result.node.name} ({joint.name})")
+
     def handle_keyboard_events(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
@@ -74,80 +150,186 @@ class Application:
 
             # 處理 a 鍵的切換
             if event.key == pygame.K_a:
-                self.auto_stepping = not self.auto_stepping
+                self.simulation.auto_stepping = not self.simulation.auto_stepping
                 
             if event.key == pygame.K_r:
                 self.robot.change_state()
 
+            # p 鍵播放變形動畫，再按一次往反方向
+            if event.key == pygame.K_p:
+                clip = self.simulation.player.clip
+                name = "to_dinosaur" if clip is not None and clip.name == "to_car" else "to_car"
+                self.simulation.play_clip(name, fade=0.3)
+
             if event.key == pygame.K_f:
                 self.robot.change_fill()    
+
+            if event.key == pygame.K_F3:
+                self.profiler.toggle()
+                if self.robot.view.hud is None:
+                    self.robot.view.hud = ProfilerHUD(self.profiler, view=self.robot.view,
+                                                      latency=self.input_latency)
+                self.frames.invalidate()
+
+            if event.key == pygame.K_F4:
+                self.profiler.dump_chrome_trace("trace.json")
+
+            if event.key == pygame.K_F7:
+                self.robot.view.skinning = not self.robot.view.skinning
+                self.frames.invalidate()
+
+            if event.key == pygame.K_F5:
+                self.toggle_recording()
+            if event.key == pygame.K_F6:
+                self.toggle_replay()
+            if self.replay is not None:
+                self.handle_replay_keys(event.key)
                 
         elif event.type == pygame.KEYUP:
             # 記錄按鍵釋放狀態
             if event.key in self.keys_pressed:
                 self.keys_pressed[event.key] = False
     
+    def toggle_recording(self):
+        if self.simulation.recorder is None:
+            self.stop_replay()
+            self.simulation.recorder = PoseRecorder(self.log_path, self.robot, self.robot.view,
+                                                    tick_rate=self.simulation.clock.tick_rate)
+        else:
+            self.simulation.recorder.close()
+            self.simulation.recorder = None
+
+    def toggle_replay(self):
+        if self.replay is not None:
+            self.stop_replay()
+            return
+        if self.simulation.recorder is not None:
+            self.toggle_recording()
+        try:
+            log = PoseLog(self.log_path)
+        except FileNotFoundError:
+            return
+        self.replay = PosePlayer(log, self.robot, self.robot.view)
+        self.replay.seek(0)
+        self.replay.play()
+
+    def stop_replay(self):
+        """結束重播，模擬從重播停下的姿勢繼續"""
+        if self.replay is None:
+            return
+        self.replay = None
+        self.simulation.sync()
+
+    def handle_replay_keys(self, key):
+        replay = self.replay
+        if key == pygame.K_COMMA:
+            replay.scrub(-1.0)
+        elif key == pygame.K_PERIOD:
+            replay.scrub(1.0)
+        elif key == pygame.K_SLASH:
+            replay.play(-replay.speed)
+        elif key == pygame.K_MINUS:
+            replay.speed /= 2
+        elif key == pygame.K_EQUALS:
+            replay.speed *= 2
+
     def update_controls(self):
+        # 每個模擬 tick 移動的距離
         vec = 0.1
-        # 如果自動執行被啟用，調用 all_add_step
-        if self.auto_stepping:
-            self.step_count += 1
-            if self.step_count % 10 == 0:
-                self.step_count = 0
-                self.robot.all_add_step()
-            
-        # 檢查並處理所有被按下的按鍵
-        if self.keys_pressed[pygame.K_z]:
-            self.robot.root_joint.rotate()
-            # print("root_joint", self.robot.root_joint.angle)
-            pass
-        if self.keys_pressed[pygame.K_x]:
-            self.robot.right_shoulder_joint.rotate()
-            # print("right_shoulder_joint", self.robot.right_shoulder_joint.angle)
-            pass
-        if self.keys_pressed[pygame.K_c]:
-            self.robot.left_shoulder_joint.rotate()
-            # print("left_shoulder_joint", self.robot.left_shoulder_joint.angle)
-
-        if self.keys_pressed[pygame.K_v]:
-            self.robot.left_leg_joint.rotate()
-            # print("left_leg_joint", self.robot.left_leg_joint.angle)
-        if self.keys_pressed[pygame.K_b]:
-            self.robot.right_leg_joint.rotate()
-            # print("right_leg_joint", self.robot.right_leg_joint.angle)
-
-        if self.keys_pressed[pygame.K_n]:
-            self.robot.tail_joint.rotate()
-            # print("tail_joint", self.robot.tail_joint.angle)
+        now = time.perf_counter()
+        # 限制單幀時間，避免長時間閒置後一次補太多 tick
+        elapsed = min(now - self.last_time, 0.25)
+        self.last_time = now
+
+        if self.replay is not None:
+            # 重播時姿勢與相機都來自錄製檔
+            self.replay.advance(elapsed)
+            return
+
+        # 按住的按鍵在每個 tick 推進對應的關節
+        self.simulation.held_joints = [joint for key, joint in self.joint_keys.items() if self.keys_pressed[key]]
+        ticks = self.simulation.advance(elapsed)
 
         if self.keys_pressed[pygame.K_LEFT]:
-            self.robot.view.view_x += vec
+            self.robot.view.view_x += vec * ticks
         if self.keys_pressed[pygame.K_RIGHT]:
-            self.robot.view.view_x -= vec
+            self.robot.view.view_x -= vec * ticks
         if self.keys_pressed[pygame.K_UP]:
-            self.robot.view.view_z += vec
+            self.robot.view.view_z += vec * ticks
         if self.keys_pressed[pygame.K_DOWN]:
-            self.robot.view.view_z -= vec
+            self.robot.view.view_z -= vec * ticks
     
+    def is_idle(self):
+        """沒有自動播放、沒有按住任何按鍵，且關節已經停止"""
+        return ((self.replay is None or not self.replay.playing)
+                and not self.simulation.auto_stepping
+                and not (self.control is not None and self.control.pending)
+                and not self.simulation.player.playing
+                and not any(self.keys_pressed.values())
+                and not self.simulation.in_motion())
+
+    def scene_signature(self):
+        return (Node.revision, self.robot.view.camera())
+
     def run(self):
         """應用程序主循環"""
         while True:
-            for event in pygame.event.get():
+            if self.is_idle():
+                # 接下來不會再畫，還沒反映到畫面的事件（例如按下又放開、沒有推進任何 tick
+                # 的按鍵）不算輸入延遲
+                self.input_latency.discard()
+                if self.control is not None:
+                    self.control.frame_skipped()
+                # 靜止時阻塞等待下一個事件，不佔用 CPU
+                events = [pygame.event.wait()] + pygame.event.get()
+                self.last_time = time.perf_counter()
+                self.pacer.reset()
+            else:
+                events = pygame.event.get()
+
+            inputs = 0
+            for event in events:
                 if event.type == pygame.QUIT:
                     self.quit()
-                
+                if event.type in WINDOW_EVENTS:
+                    self.frames.invalidate()
                 self.handle_mouse_events(event)
                 self.handle_keyboard_events(event)
+                # 沒按住左鍵的滑鼠移動不會改變畫面，不計入
+                if event.type in INPUT_EVENTS and not (event.type == pygame.MOUSEMOTION and not self.mouse_pressed):
+                    inputs += 1
+            if inputs:
+                self.input_latency.mark(inputs)
             
+            self.apply_drag()
             self.update_controls()
-            self.robot.view.render(self.robot)
-            pygame.time.wait(10)
+            if self.frames.should_render(self.scene_signature()):
+                self.robot.view.render(self.robot)
+                self.input_latency.presented()
+                if self.control is not None:
+                    self.control.frame_presented()
+            # 沒有重畫時保留記下的事件：它們的效果可能在下一輪（有 tick 時）才出現
+            if not self.is_idle():
+                self.pacer.wait()
             
     def quit(self):
         """退出應用程序"""
+        if self.simulation.recorder is not None:
+            self.simulation.recorder.close()
+        if self.control is not None:
+            self.control.stop()
+        latency = self.input_latency.percentiles()
+        if latency is not None:
+            print(f"輸入到畫面延遲 p50 {latency[0]:.1f} ms, p99 {latency[1]:.1f} ms"
+                  f"（{self.input_latency.events} 個事件，{self.pacer.late} 幀超過截止時間）")
         pygame.quit()
         sys.exit()
 
 if __name__ == '__main__':
-    app = Application()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scene", nargs="?", help="場景描述檔（見 scene_file.py）")
+    parser.add_argument("--control", metavar="ADDRESS", help="開啟控制伺服器：TCP 埠號或 Unix socket 路徑")
+    args = parser.parse_args()
+    app = Application(scene_path=args.scene, control_address=args.control)
     app.run()
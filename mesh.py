@@ -0,0 +1,185 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class Mesh:
+    """預先建好的網格：float32 頂點陣列 + 三角形與線段索引"""
+    def __init__(self, vertices, triangles, edges):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.uint32).reshape(-1)
+        # 相鄰面共用的邊只保留一次
+        self.edges = unique_edges(edges)
+        # 局部座標的軸對齊包圍盒 (最小角, 最大角)
+        if len(self.vertices):
+            self.bounds = (self.vertices.min(axis=0).astype(np.float64),
+                           self.vertices.max(axis=0).astype(np.float64))
+        else:
+            self.bounds = None
+
+
+def unique_edges(edges):
+    """去掉重複的線段（不分方向），保留第一次出現的順序，回傳攤平的索引"""
+    edges = np.asarray(edges, dtype=np.uint32).reshape(-1, 2)
+    if len(edges) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    _, first = np.unique(np.sort(edges, axis=1), axis=0, return_index=True)
+    return np.ascontiguousarray(edges[np.sort(first)]).reshape(-1)
+
+
+class MeshCache:
+    """全域共用的網格快取，以 (類型, 參數) 為鍵，超過上限時淘汰最久沒用的"""
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._meshes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, builder):
+        """取得 key 對應的網格，沒有就呼叫 builder() 建立"""
+        mesh = self._meshes.get(key)
+        if mesh is not None:
+            self._meshes.move_to_end(key)
+            self.hits += 1
+            return mesh
+
+        self.misses += 1
+        mesh = builder()
+        self._meshes[key] = mesh
+        if len(self._meshes) > self.max_size:
+            self._meshes.popitem(last=False)
+            self.evictions += 1
+        return mesh
+
+    def clear(self):
+        self._meshes.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            "size": len(self._meshes),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._meshes)
+
+
+mesh_cache = MeshCache()
+
+
+def _quads_to_triangles(quads):
+    """把 (a, b, c, d) 四邊形拆成兩個三角形"""
+    quads = np.asarray(quads, dtype=np.uint32).reshape(-1, 4)
+    return np.concatenate([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]])
+
+
+def _loop_edges(ring):
+    """一圈頂點索引連成封閉線段 (i, i+1)"""
+    ring = np.asarray(ring, dtype=np.uint32)
+    return np.stack([ring, np.roll(ring, -1)], axis=1)
+
+
+def _ring(radius, y, segments):
+    angles = 2 * np.pi * np.arange(segments) / segments
+    return np.stack([radius * np.cos(angles),
+                     np.full(segments, y),
+                     radius * np.sin(angles)], axis=1)
+
+
+CUBE_FACES = np.array([
+    (0, 1, 2, 3), (4, 5, 6, 7), (0, 4, 7, 3),
+    (1, 5, 6, 2), (0, 1, 5, 4), (3, 2, 6, 7)
+], dtype=np.uint32)
+
+
+def build_cube_mesh(vertices):
+    """立方體：8 個頂點、12 條邊"""
+    edges = np.concatenate([_loop_edges(face) for face in CUBE_FACES])
+    return Mesh(vertices, _quads_to_triangles(CUBE_FACES), edges)
+
+
+def build_wheel_mesh(inner_radius, outer_radius, height, segments):
+    """中空圓柱：上下外圈、上下內圈共四圈頂點"""
+    h = height / 2
+    vertices = np.concatenate([
+        _ring(outer_radius, h, segments),
+        _ring(inner_radius, h, segments),
+        _ring(outer_radius, -h, segments),
+        _ring(inner_radius, -h, segments),
+    ])
+    i = np.arange(segments, dtype=np.uint32)
+    j = (i + 1) % segments
+    outer_top, inner_top = i, i + segments
+    outer_bottom, inner_bottom = i + 2 * segments, i + 3 * segments
+    n_outer_top, n_inner_top = j, j + segments
+    n_outer_bottom, n_inner_bottom = j + 2 * segments, j + 3 * segments
+
+    quads = np.concatenate([
+        # 頂面和底面
+        np.stack([outer_top, inner_top, n_inner_top, n_outer_top], axis=1),
+        np.stack([outer_bottom, inner_bottom, n_inner_bottom, n_outer_bottom], axis=1),
+        # 外側面和內側面
+        np.stack([outer_top, outer_bottom, n_outer_bottom, n_outer_top], axis=1),
+        np.stack([inner_top, inner_bottom, n_inner_bottom, n_inner_top], axis=1),
+    ])
+    edges = np.concatenate([
+        _loop_edges(outer_top), _loop_edges(inner_top),
+        _loop_edges(outer_bottom), _loop_edges(inner_bottom),
+        np.stack([outer_top, outer_bottom], axis=1),
+        np.stack([inner_top, inner_bottom], axis=1),
+    ])
+    return Mesh(vertices, _quads_to_triangles(quads), edges)
+
+
+def build_cylinder_mesh(radius, height, segments):
+    """實心圓柱：上下兩圈頂點加上兩個圓心"""
+    h = height / 2
+    vertices = np.concatenate([
+        _ring(radius, h, segments),
+        _ring(radius, -h, segments),
+        [(0, h, 0), (0, -h, 0)],
+    ])
+    i = np.arange(segments, dtype=np.uint32)
+    j = (i + 1) % segments
+    top, bottom = i, i + segments
+    n_top, n_bottom = j, j + segments
+    top_center = np.full(segments, 2 * segments, dtype=np.uint32)
+    bottom_center = top_center + 1
+
+    triangles = np.concatenate([
+        np.stack([top_center, top, n_top], axis=1),
+        np.stack([bottom_center, bottom, n_bottom], axis=1),
+        _quads_to_triangles(np.stack([top, bottom, n_bottom, n_top], axis=1)),
+    ])
+    edges = np.concatenate([
+        _loop_edges(top), _loop_edges(bottom),
+        np.stack([top, bottom], axis=1),
+    ])
+    return Mesh(vertices, triangles, edges)
+
+
+def build_sphere_mesh(radius, slices, stacks):
+    """與 gluSphere 相同的經緯網格（沿 z 軸分層）"""
+    rho = np.pi * np.arange(stacks + 1) / stacks
+    theta = 2 * np.pi * np.arange(slices) / slices
+    ring = radius * np.sin(rho)[:, None]
+    vertices = np.stack([
+        ring * np.cos(theta)[None, :],
+        ring * np.sin(theta)[None, :],
+        np.repeat((radius * np.cos(rho))[:, None], slices, axis=1),
+    ], axis=2).reshape(-1, 3)
+
+    grid = np.arange((stacks + 1) * slices, dtype=np.uint32).reshape(stacks + 1, slices)
+    nxt = np.roll(grid, -1, axis=1)
+    quads = np.stack([grid[:-1], grid[1:], nxt[1:], nxt[:-1]], axis=2).reshape(-1, 4)
+    edges = np.concatenate([
+        # 緯線（不含兩極）
+        np.stack([grid[1:-1], nxt[1:-1]], axis=2).reshape(-1, 2),
+        # 經線
+        np.stack([grid[:-1], grid[1:]], axis=2).reshape(-1, 2),
+    ])
+    return Mesh(vertices, _quads_to_triangles(quads), edges)
@@ -0,0 +1,172 @@
+"""無視窗的離屏渲染
+
+透過 EGL 建立不需要顯示器的 OpenGL context（沒有 GPU 時由 Mesa llvmpipe 軟體渲染），
+畫到 FBO 後讀回 NumPy 陣列，可以存成 PNG 或寫到 raw video pipe（例如 ffmpeg）。
+
+必須在其他模組 import OpenGL 之前 import 本模組，PyOpenGL 才會使用 EGL 平台。
+"""
+import os
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+# 沒有 X/Wayland 時使用 Mesa 的 surfaceless 平台
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import ctypes
+import struct
+import subprocess
+import zlib
+import numpy as np
+from OpenGL import EGL
+from OpenGL.GL import *
+from RobotView import RobotView
+
+
+def create_egl_context():
+    """建立一個 1x1 pbuffer 的 EGL OpenGL context 並設為目前 context"""
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("無法初始化 EGL display")
+
+    config_attribs = (EGL.EGLint * 13)(
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_DEPTH_SIZE, 24,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_NONE)
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+        raise RuntimeError("找不到可用的 EGL config")
+
+    surface_attribs = (EGL.EGLint * 5)(EGL.EGL_WIDTH, 1, EGL.EGL_HEIGHT, 1, EGL.EGL_NONE)
+    surface = EGL.eglCreatePbufferSurface(display, config, surface_attribs)
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("無法啟用 EGL context")
+    return display, surface, context
+
+
+def write_png(path, image):
+    """把 (H, W, 3) uint8 影像存成 PNG（不需要 PIL）"""
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    # 每一列前面加上 filter type 0
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xffffffff)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 1)))
+        f.write(chunk(b"IEND", b""))
+
+
+def open_video_pipe(path, width, height, fps=30):
+    """啟動 ffmpeg，回傳的 process.stdin 可直接寫入 rgb24 影格"""
+    command = [
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "-", path,
+    ]
+    return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+
+class OffscreenRenderer:
+    """在 FBO 中渲染 Robot 或 scene.Scene，回傳 NumPy 影像"""
+    def __init__(self, width=512, height=512):
+        self.width = width
+        self.height = height
+        self.egl = create_egl_context()
+        self._create_framebuffer()
+        self.view = RobotView(aspect=width / height, present=None)
+
+    def make_current(self):
+        """同一個程序有多個 OffscreenRenderer 時，切換回這一個的 context"""
+        display, surface, context = self.egl
+        EGL.eglMakeCurrent(display, surface, surface, context)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+
+    def _create_framebuffer(self):
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        self.color_buffer, self.depth_buffer = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color_buffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, self.width, self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color_buffer)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth_buffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, self.width, self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth_buffer)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("FBO 不完整")
+        glViewport(0, 0, self.width, self.height)
+
+    def read_frame(self):
+        """讀回目前的畫面，(H, W, 3) uint8，第一列為畫面頂端"""
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        data = glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE)
+        frame = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+        return frame[::-1].copy()
+
+    def render(self, robot):
+        self.view.render(robot)
+        return self.read_frame()
+
+    def render_scene(self, scene):
+        self.view.render_scene(scene)
+        return self.read_frame()
+
+    def save_png(self, robot, path):
+        write_png(path, self.render(robot))
+
+
+def main():
+    import argparse
+    import time
+    from robot import Robot
+
+    parser = argparse.ArgumentParser(description="離屏渲染變形動畫")
+    parser.add_argument("--size", type=int, nargs=2, default=(512, 512), metavar=("W", "H"))
+    parser.add_argument("--steps", type=int, default=21, help="all_add_step 的次數")
+    parser.add_argument("--rot-y", type=float, default=30.0)
+    parser.add_argument("--rot-x", type=float, default=20.0)
+    parser.add_argument("--wireframe", action="store_true")
+    parser.add_argument("--out", default="frames", help="PNG 輸出資料夾")
+    parser.add_argument("--video", help="改為透過 ffmpeg 輸出影片檔")
+    args = parser.parse_args()
+
+    width, height = args.size
+    renderer = OffscreenRenderer(width, height)
+    renderer.view.view_rot_x = args.rot_x
+    renderer.view.view_rot_y = args.rot_y
+    robot = Robot(create_view=False)
+    if args.wireframe:
+        robot.change_fill()
+
+    pipe = open_video_pipe(args.video, width, height) if args.video else None
+    if pipe is None:
+        os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    for i in range(args.steps + 1):
+        frame = renderer.render(robot)
+        if pipe is not None:
+            pipe.stdin.write(frame.tobytes())
+        else:
+            write_png(os.path.join(args.out, f"frame_{i:04d}.png"), frame)
+        robot.all_add_step()
+    elapsed = time.perf_counter() - start
+
+    if pipe is not None:
+        pipe.stdin.close()
+        pipe.wait()
+    print(f"{args.steps + 1} frames, {(args.steps + 1) / elapsed:.1f} fps")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""以射線在 CPU 上挑選零件，不需要 GL_SELECT 或讀回畫面
+
+先用 culling.BoundingHierarchy 的子樹包圍盒排除整棵子樹，
+再對剩下的候選節點在局部座標中與網格三角形求交。
+"""
+import numpy as np
+from components import Joint, Node
+from culling import BoundingHierarchy, transform_bounds
+
+
+def screen_ray(camera, x, y, width, height):
+    """視窗座標（左上角為原點）經相機反投影成世界座標的射線 (起點, 單位方向)"""
+    ndc_x = 2.0 * x / width - 1.0
+    ndc_y = 1.0 - 2.0 * y / height
+    inverse = np.linalg.inv(camera.projection_matrix() @ camera.view_matrix())
+    near = inverse @ (ndc_x, ndc_y, -1.0, 1.0)
+    far = inverse @ (ndc_x, ndc_y, 1.0, 1.0)
+    near = near[:3] / near[3]
+    far = far[:3] / far[3]
+    direction = far - near
+    return near, direction / np.linalg.norm(direction)
+
+
+def ray_boxes(origin, direction, lower, upper):
+    """射線與 (n, 3) 個 AABB 的 slab 測試，回傳 (是否相交, 進入距離)"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse = 1.0 / direction
+        t0 = (lower - origin) * inverse
+        t1 = (upper - origin) * inverse
+    # 方向分量為 0 且起點剛好在 slab 邊界上時 0 * inf 會是 nan，當作不限制
+    undefined = np.isnan(t0) | np.isnan(t1)
+    t_near = np.where(undefined, -np.inf, np.minimum(t0, t1)).max(axis=1)
+    t_far = np.where(undefined, np.inf, np.maximum(t0, t1)).min(axis=1)
+    hit = (t_near <= t_far) & (t_far >= 0)
+    return hit, np.maximum(t_near, 0)
+
+
+def ray_triangles(origin, direction, vertices, triangles):
+    """Möller–Trumbore，一次測試所有三角形，回傳最近的距離（沒有交點時為 None）"""
+    tri = vertices[triangles.reshape(-1, 3)].astype(np.float64)
+    edge1 = tri[:, 1] - tri[:, 0]
+    edge2 = tri[:, 2] - tri[:, 0]
+    p = np.cross(direction, edge2)
+    det = np.einsum("ij,ij->i", edge1, p)
+    valid = np.abs(det) > 1e-12
+    inv_det = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    s = origin - tri[:, 0]
+    u = np.einsum("ij,ij->i", s, p) * inv_det
+    q = np.cross(s, edge1)
+    v = (q @ direction) * inv_det
+    t = np.einsum("ij,ij->i", edge2, q) * inv_det
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    if not hit.any():
+        return None
+    return float(t[hit].min())
+
+
+class PickResult:
+    def __init__(self, node, distance, point, robot=None):
+        self.node = node
+        self.distance = distance
+        self.point = point
+        self.robot = robot
+
+    @property
+    def joint(self):
+        """帶動這個零件的關節（最近的 Joint 祖先）"""
+        return driving_joint(self.node)
+
+
+def driving_joint(node):
+    while node is not None and not isinstance(node, Joint):
+        node = node.parent
+    return node
+
+
+class Picker:
+    """對單一 Kinematics 樹挑選；可共用 RobotView 已建立的 BoundingHierarchy"""
+    def __init__(self, kinematics, hierarchy=None):
+        self.kinematics = kinematics
+        self.hierarchy = hierarchy or BoundingHierarchy(kinematics)
+        self.tested = 0
+
+    def candidates(self, origin, direction):
+        """子樹包圍盒與自身包圍盒都被射線穿過的節點，依進入距離排序"""
+        hierarchy = self.hierarchy
+        hierarchy.refit()
+        kinematics = self.kinematics
+        parents = kinematics.parents
+        finite = np.isfinite(hierarchy.subtree_lower[:, 0])
+        subtree_hit, _ = ray_boxes(origin, direction,
+                                   np.where(finite[:, None], hierarchy.subtree_lower, 0),
+                                   np.where(finite[:, None], hierarchy.subtree_upper, 0))
+        subtree_hit &= finite
+        reached = subtree_hit.copy()
+        for level in kinematics.levels[1:]:
+            reached[level] &= reached[parents[level]]
+        own_hit, entry = ray_boxes(origin, direction, hierarchy.lower, hierarchy.upper)
+        candidates = np.flatnonzero(reached & own_hit & hierarchy.has_bounds)
+        return candidates[np.argsort(entry[candidates])], entry
+
+    def pick(self, origin, direction):
+        """回傳最近的 PickResult，沒有打到任何零件時為 None"""
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        candidates, entry = self.candidates(origin, direction)
+        self.tested = 0
+        best = None
+        for i in candidates:
+            # 包圍盒比目前最近的交點還遠，後面的都不可能更近
+            if best is not None and entry[i] > best.distance:
+                break
+            self.tested += 1
+            node = self.kinematics.nodes[i]
+            mesh = node.get_mesh()
+            world = self.kinematics.world[i]
+            inverse = np.linalg.inv(world)
+            local_origin = inverse[:3, :3] @ origin + inverse[:3, 3]
+            local_direction = inverse[:3, :3] @ direction
+            # 矩陣只有旋轉與平移，局部距離等於世界距離
+            distance = ray_triangles(local_origin, local_direction, mesh.vertices, mesh.triangles)
+            if distance is not None and (best is None or distance < best.distance):
+                best = PickResult(node, distance, origin + direction * distance)
+        return best
+
+
+class ScenePicker:
+    """在 scene.Scene 的多台機器人中挑選
+
+    兩層階層：先一次測試所有機器人的整體包圍盒，再只測試被穿過的機器人的零件。
+    包圍盒只在場景有變化（Node.revision）時重新計算。
+    """
+    def __init__(self, scene):
+        self.scene = scene
+        self.tested = 0
+        self._layout_key = None
+        self._revision = None
+
+    def _build(self):
+        nodes, lower, upper, has_bounds, offsets = [], [], [], [], [0]
+        for robot in self.scene.robots:
+            hierarchy = BoundingHierarchy(robot.kinematics)
+            hierarchy.refit()
+            nodes.extend(robot.kinematics.nodes)
+            lower.append(hierarchy.local_lower)
+            upper.append(hierarchy.local_upper)
+            has_bounds.append(hierarchy.has_bounds)
+            offsets.append(offsets[-1] + len(robot.kinematics.nodes))
+        self.nodes = nodes
+        self.local_lower = np.concatenate(lower)
+        self.local_upper = np.concatenate(upper)
+        self.has_bounds = np.concatenate(has_bounds)
+        self.offsets = np.array(offsets)
+
+    def refit(self):
+        layout_key = (len(self.scene.robots), Node.style_revision)
+        if layout_key != self._layout_key:
+            self._build()
+            self._layout_key = layout_key
+            self._revision = None
+        if self._revision == Node.revision:
+            return
+        self._revision = Node.revision
+
+        for robot in self.scene.robots:
+            robot.kinematics.update()
+        self.world = self.scene.world_matrices()
+        self.lower, self.upper = transform_bounds(self.local_lower, self.local_upper, self.world)
+        empty = ~self.has_bounds[:, None]
+        starts = self.offsets[:-1]
+        self.robot_lower = np.minimum.reduceat(np.where(empty, np.inf, self.lower), starts)
+        self.robot_upper = np.maximum.reduceat(np.where(empty, -np.inf, self.upper), starts)
+
+    def pick(self, origin, direction):
+        self.refit()
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        robots = np.flatnonzero(ray_boxes(origin, direction, self.robot_lower, self.robot_upper)[0])
+        self.tested = 0
+        if robots.size == 0:
+            return None
+        indices = np.concatenate([np.arange(self.offsets[r], self.offsets[r + 1]) for r in robots])
+        indices = indices[self.has_bounds[indices]]
+        hit, entry = ray_boxes(origin, direction, self.lower[indices], self.upper[indices])
+        order = np.argsort(entry[hit])
+        candidates, entry = indices[hit][order], entry[hit][order]
+
+        best = None
+        for i, enter in zip(candidates, entry):
+            if best is not None and enter > best.distance:
+                break
+            self.tested += 1
+            mesh = self.nodes[i].get_mesh()
+            inverse = np.linalg.inv(self.world[i])
+            distance = ray_triangles(inverse[:3, :3] @ origin + inverse[:3, 3],
+                                     inverse[:3, :3] @ direction, mesh.vertices, mesh.triangles)
+            if distance is not None and (best is None or distance < best.distance):
+                robot = self.scene.robots[np.searchsorted(self.offsets, i, side="right") - 1]
+                best = PickResult(self.nodes[i], distance, origin + direction * distance, robot)
+        return best
@@ -0,0 +1,101 @@
+"""以連續陣列保存所有關節的姿勢
+
+每個 Joint 建立時向 pose_store 取得一個 joint_id，角度、步數與狀態都存放在
+PoseStore 的陣列中，Joint.angle / step / state 只是這些陣列的檢視。
+同一台機器人的關節 id 通常是連續的，快照與還原只是一次陣列複製。
+Joint 被回收時歸還 id，之後建立的關節從最小的空位開始重用。
+"""
+import heapq
+
+import numpy as np
+
+# Joint.state 的可能值，陣列中存放索引
+STATES = ("dinosaur", "car")
+
+
+class PoseStore:
+    """所有關節的 angle (float32)、step (int32)、state (int8)，以 joint id 索引"""
+    def __init__(self, capacity=64):
+        self.angles = np.zeros(capacity, dtype=np.float32)
+        self.steps = np.zeros(capacity, dtype=np.int32)
+        self.states = np.zeros(capacity, dtype=np.int8)
+        self.count = 0
+        self._free = []
+
+    def allocate(self):
+        """配置一個 joint id，優先重用歸還的最小 id，容量不足時加倍"""
+        if self._free:
+            return heapq.heappop(self._free)
+        if self.count == len(self.angles):
+            capacity = len(self.angles) * 2
+            for name in ("angles", "steps", "states"):
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+        joint_id = self.count
+        self.count += 1
+        return joint_id
+
+    def free(self, joint_id):
+        """歸還 joint id（Joint 被回收時呼叫）"""
+        heapq.heappush(self._free, joint_id)
+
+    @staticmethod
+    def select(ids):
+        """ids 連續時回傳 slice（之後的索引不必複製索引陣列），否則回傳 int 陣列"""
+        ids = np.asarray(ids, dtype=np.intp)
+        if ids.size and np.array_equal(ids, np.arange(ids[0], ids[0] + ids.size)):
+            return slice(int(ids[0]), int(ids[0]) + ids.size)
+        return ids
+
+    def snapshot(self, ids):
+        return Pose(self.angles[ids].copy(), self.steps[ids].copy(), self.states[ids].copy())
+
+    def write(self, ids, pose):
+        self.angles[ids] = pose.angles
+        self.steps[ids] = pose.steps
+        self.states[ids] = pose.states
+
+
+pose_store = PoseStore()
+
+
+class Pose:
+    """一組關節的姿勢快照；robot_step / robot_state 為 Robot 自身的狀態"""
+    __slots__ = ("angles", "steps", "states", "robot_step", "robot_state")
+
+    def __init__(self, angles, steps, states, robot_step=0, robot_state=0):
+        self.angles = angles
+        self.steps = steps
+        self.states = states
+        self.robot_step = robot_step
+        self.robot_state = robot_state
+
+    @property
+    def nbytes(self):
+        return self.angles.nbytes + self.steps.nbytes + self.states.nbytes
+
+    def copy(self):
+        return Pose(self.angles.copy(), self.steps.copy(), self.states.copy(),
+                    self.robot_step, self.robot_state)
+
+
+def diff(a, b):
+    """(角度差 b - a, 有任何欄位不同的關節)"""
+    changed = (a.angles != b.angles) | (a.steps != b.steps) | (a.states != b.states)
+    return b.angles - a.angles, changed
+
+
+def interpolate(a, b, t):
+    """角度的線性內插；t 可以是陣列，結果形狀為 (len(t), 關節數)"""
+    t = np.asarray(t, dtype=np.float32)
+    delta = b.angles - a.angles
+    if t.ndim:
+        return a.angles + delta * t[:, None]
+    return a.angles + delta * t
+
+
+def stack(poses):
+    """把多個快照的角度疊成 (快照數, 關節數) 陣列，方便一次比較整段歷史"""
+    return np.stack([pose.angles for pose in poses])
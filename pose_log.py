@@ -0,0 +1,278 @@
+"""以記憶體映射檔錄製與重播姿勢
+
+    python pose_log.py info session.poselog     # 顯示錄製檔資訊
+    python pose_log.py bench                    # 量測一小時錄製的寫入與跳轉成本
+
+檔案為固定 4096 位元組的檔頭（magic、版本、紀錄數、JSON 描述）加上一連串
+固定長度的紀錄，每個模擬 tick 一筆：從開始錄製經過的秒數、關節角度、步數、狀態、
+Robot 的步數與狀態以及相機參數。主迴圈閒置時沒有 tick，也就沒有紀錄，
+重播依時間戳記進行，所以停頓會照原本的長度重現。紀錄長度固定，第 i 筆的位置可以
+直接算出，依時間跳轉只需要對時間欄做二分搜尋；讀取時以 np.memmap 映射，
+只有實際讀到的頁面會載入記憶體。
+"""
+import bisect
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+from pose import Pose, pose_store
+
+MAGIC = b"POSELOG\0"
+VERSION = 2
+HEADER_SIZE = 4096
+# magic、版本、JSON 長度、紀錄數
+HEADER_FORMAT = "<8sIIQ"
+COUNT_OFFSET = 16
+
+
+def record_dtype(joint_count):
+    return np.dtype([
+        ("tick", "<u8"),
+        ("time", "<f8"),
+        ("camera", "<f4", 5),
+        ("robot_step", "<i4"),
+        ("robot_state", "<i1"),
+        ("angles", "<f4", joint_count),
+        ("steps", "<i4", joint_count),
+        ("states", "<i1", joint_count),
+    ])
+
+
+def joint_names(robot):
+    return [joint.name for joint in robot.joints]
+
+
+class PoseRecorder:
+    """把每個 tick 的姿勢附加到 path
+
+    檔案每次以 chunk 筆為單位加長並重新映射，紀錄數在加長與 flush 時寫回檔頭，
+    程式中途結束時最多遺失最後一段尚未 flush 的紀錄。
+    """
+    def __init__(self, path, robot, camera=None, tick_rate=60, chunk=3600):
+        self.path = path
+        self.robot = robot
+        self.camera = camera
+        self.tick_rate = tick_rate
+        self.chunk = chunk
+        self.dtype = record_dtype(len(robot.joints))
+        self.count = 0
+        self.capacity = 0
+        self.start = time.perf_counter()
+
+        info = json.dumps({
+            "tick_rate": tick_rate,
+            "joints": joint_names(robot),
+        }).encode()
+        if struct.calcsize(HEADER_FORMAT) + len(info) > HEADER_SIZE:
+            raise ValueError("關節太多，描述放不進檔頭")
+        self.file = open(path, "w+b")
+        self.file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(info), 0) + info)
+        self._grow()
+
+    def _grow(self):
+        self.capacity += self.chunk
+        self.file.truncate(HEADER_SIZE + self.capacity * self.dtype.itemsize)
+        self.records = np.memmap(self.file, dtype=self.dtype, mode="r+",
+                                 offset=HEADER_SIZE, shape=(self.capacity,))
+        self._write_count()
+
+    def _write_count(self):
+        self.file.seek(COUNT_OFFSET)
+        self.file.write(struct.pack("<Q", self.count))
+        self.file.flush()
+
+    def record(self, tick=None, seconds=None):
+        """寫入目前的姿勢；只是幾次陣列複製，不做任何系統呼叫（加長檔案時除外）
+
+        seconds 為從開始錄製經過的時間，預設為現在的時間。
+        """
+        if self.count == self.capacity:
+            self.records.flush()
+            self._grow()
+        robot = self.robot
+        row = self.records[self.count]
+        row["tick"] = self.count if tick is None else tick
+        row["time"] = time.perf_counter() - self.start if seconds is None else seconds
+        if self.camera is not None:
+            row["camera"] = self.camera.camera()
+        row["robot_step"] = robot.step
+        row["robot_state"] = robot.state
+        ids = robot.joint_ids
+        row["angles"] = pose_store.angles[ids]
+        row["steps"] = pose_store.steps[ids]
+        row["states"] = pose_store.states[ids]
+        self.count += 1
+
+    def flush(self):
+        self.records.flush()
+        self._write_count()
+
+    def close(self):
+        """寫回紀錄數並截掉沒用到的預留空間"""
+        if self.file.closed:
+            return
+        self.flush()
+        del self.records
+        self.file.truncate(HEADER_SIZE + self.count * self.dtype.itemsize)
+        self.file.close()
+
+
+class PoseLog:
+    """唯讀開啟錄製檔，len() 為紀錄數，log[i] 為第 i 筆紀錄"""
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, info_size, count = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+            if magic != MAGIC:
+                raise ValueError(f"{path} 不是姿勢錄製檔")
+            if version != VERSION:
+                raise ValueError(f"{path} 的版本 {version} 不受支援")
+            info = json.loads(f.read(info_size))
+        self.path = path
+        self.tick_rate = info["tick_rate"]
+        self.joints = info["joints"]
+        self.dtype = record_dtype(len(self.joints))
+        # 未正常關閉的檔案以檔頭的紀錄數為準，不超過檔案實際的長度
+        available = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        count = min(count, available)
+        self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE,
+                                 shape=(count,)) if count else np.zeros(0, dtype=self.dtype)
+        # 時間欄的 view，不複製（二分搜尋只會讀到少數幾頁）
+        self.times = self.records["time"]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self) else 0.0
+
+    def index(self, seconds):
+        """時間 seconds 時正在顯示的紀錄（最後一筆時間不超過 seconds 的紀錄）"""
+        return max(bisect.bisect_right(self.times, seconds) - 1, 0)
+
+    def pose(self, index):
+        record = self.records[index]
+        return Pose(np.array(record["angles"]), np.array(record["steps"]), np.array(record["states"]),
+                    int(record["robot_step"]), int(record["robot_state"]))
+
+
+class PosePlayer:
+    """在錄製檔中以任意速度播放；speed 為負數時倒著播放
+
+    position 為錄製檔中的時間（秒）。相鄰兩筆紀錄之間的角度與相機參數線性內插；
+    間隔超過一個 tick 半的兩筆紀錄之間是閒置的停頓，維持前一筆的姿勢。
+    """
+    def __init__(self, log, robot, camera=None):
+        if log.joints != joint_names(robot):
+            raise ValueError("錄製檔的關節與這台機器人不同")
+        self.log = log
+        self.robot = robot
+        self.camera = camera
+        self.position = 0.0
+        self.speed = 1.0
+        self.playing = False
+
+    @property
+    def end(self):
+        return self.log.duration
+
+    def play(self, speed=None):
+        if speed is not None:
+            self.speed = speed
+        self.playing = len(self.log) > 0
+
+    def stop(self):
+        self.playing = False
+
+    def seek(self, position):
+        """跳到第 position 秒並套用"""
+        self.position = min(max(float(position), 0.0), float(self.end))
+        self.apply()
+
+    def scrub(self, seconds):
+        """從目前位置前後移動 seconds 秒"""
+        self.seek(self.position + seconds)
+
+    def advance(self, elapsed):
+        """播放 elapsed 秒，走到頭（或倒播到開頭）時停止"""
+        if not self.playing:
+            return
+        self.seek(self.position + elapsed * self.speed)
+        if (self.speed > 0 and self.position >= self.end) or (self.speed < 0 and self.position <= 0):
+            self.playing = False
+
+    def apply(self):
+        if len(self.log) == 0:
+            return
+        log = self.log
+        index = log.index(self.position)
+        a = log[index]
+        b = log[min(index + 1, len(log) - 1)]
+        gap = float(b["time"] - a["time"])
+        t = (self.position - float(a["time"])) / gap if 0 < gap <= 1.5 / log.tick_rate else 0.0
+        t = min(max(t, 0.0), 1.0)
+        pose = log.pose(index)
+        if t:
+            pose.angles = a["angles"] + (b["angles"] - a["angles"]) * np.float32(t)
+        self.robot.restore(pose)
+        if self.camera is not None:
+            camera = a["camera"] + (b["camera"] - a["camera"]) * np.float32(t)
+            (self.camera.view_x, self.camera.view_y, self.camera.view_z,
+             self.camera.view_rot_x, self.camera.view_rot_y) = camera.tolist()
+
+
+def info(path):
+    log = PoseLog(path)
+    size = os.path.getsize(path)
+    print(f"{path}: {len(log)} 筆，{log.duration:.1f} 秒（{log.tick_rate} Hz），"
+          f"{len(log.joints)} 個關節，每筆 {log.dtype.itemsize} 位元組，共 {size / 1e6:.1f} MB")
+
+
+def bench(seconds=3600):
+    """錄製 seconds 秒的 tick 並隨機跳轉，回傳 (每筆寫入微秒, 每次跳轉微秒)"""
+    from robot import Robot
+    from camera import Camera
+    robot = Robot(create_view=False)
+    camera = Camera()
+    path = os.path.join(tempfile.mkdtemp(), "bench.poselog")
+    recorder = PoseRecorder(path, robot, camera)
+    count = seconds * recorder.tick_rate
+    start = time.perf_counter()
+    for tick in range(count):
+        if tick % 10 == 0:
+            robot.all_add_step()
+        recorder.record(tick, tick / recorder.tick_rate)
+    recorder.close()
+    record_time = (time.perf_counter() - start) / count
+
+    player = PosePlayer(PoseLog(path), robot, camera)
+    positions = np.random.default_rng(0).uniform(0, player.end, 1000)
+    start = time.perf_counter()
+    for position in positions:
+        player.seek(position)
+    seek_time = (time.perf_counter() - start) / len(positions)
+    info(path)
+    os.remove(path)
+    return record_time * 1e6, seek_time * 1e6
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "info":
+        for path in sys.argv[2:]:
+            info(path)
+    elif command == "bench":
+        record_us, seek_us = bench()
+        print(f"錄製 {record_us:.1f} µs/tick，跳轉並套用 {seek_us:.1f} µs")
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main()
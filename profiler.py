@@ -0,0 +1,143 @@
+"""每幀效能分析（預設關閉）
+
+RobotView.render 每幀只檢查一次 profiler.enabled；關閉時沒有任何包裝函式。
+開啟時才安裝 gl_stats.GLCallCounter，繪製路徑與關閉時相同（display list、EdgeBatch
+或著色器），只是各階段與每個 display list 群組以 measure 分段計時。
+"""
+from collections import deque
+import json
+import time
+import numpy as np
+
+
+class FrameProfiler:
+    def __init__(self, history=600, max_trace_events=200000):
+        self.enabled = False
+        self.frame_times = deque(maxlen=history)
+        # 最近一幀每一段的 (CPU 時間, GL 呼叫次數)
+        self.sections = {}
+        self.trace_events = deque(maxlen=max_trace_events)
+        self.counter = None
+        self._frame_start = 0.0
+        self._frame_calls = 0
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        if self.enabled:
+            return
+        from gl_stats import GLCallCounter, DEFAULT_MODULES
+        self.counter = GLCallCounter(DEFAULT_MODULES + ("skinning",)).install()
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.counter.uninstall()
+        self.counter = None
+        self.enabled = False
+
+    def toggle(self):
+        self.disable() if self.enabled else self.enable()
+
+    def _timestamp(self, t):
+        """Chrome trace 使用微秒"""
+        return (t - self._origin) * 1e6
+
+    def begin_frame(self):
+        self.sections = {}
+        self._frame_calls = self.counter.total()
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        end = time.perf_counter()
+        duration = end - self._frame_start
+        self.frame_times.append(duration)
+        self.trace_events.append({
+            "name": "frame", "ph": "X", "pid": 0, "tid": 0,
+            "ts": self._timestamp(self._frame_start), "dur": duration * 1e6,
+            "args": {"gl_calls": self.counter.total() - self._frame_calls},
+        })
+
+    def measure(self, name, function, *args):
+        """計時並計數一段繪製，回傳 function 的結果"""
+        calls = self.counter.total()
+        start = time.perf_counter()
+        result = function(*args)
+        end = time.perf_counter()
+        calls = self.counter.total() - calls
+        self.sections[name] = (end - start, calls)
+        self.trace_events.append({
+            "name": name, "ph": "X", "pid": 0, "tid": 0,
+            "ts": self._timestamp(start), "dur": (end - start) * 1e6,
+            "args": {"gl_calls": calls},
+        })
+        return result
+
+    def percentiles(self, *qs):
+        """最近幾幀的幀時間百分位數（毫秒）"""
+        if not self.frame_times:
+            return [0.0] * len(qs)
+        return list(np.percentile(np.array(self.frame_times) * 1000, qs))
+
+    def histogram(self, bins=20):
+        """(各區間次數, 區間邊界 ms)"""
+        return np.histogram(np.array(self.frame_times) * 1000, bins=bins)
+
+    def fps(self):
+        if not self.frame_times:
+            return 0.0
+        return len(self.frame_times) / sum(self.frame_times)
+
+    def top_sections(self, n=5):
+        """最近一幀最耗時的幾段 [(名稱, 秒, GL 呼叫數), ...]"""
+        items = sorted(self.sections.items(), key=lambda item: item[1][0], reverse=True)
+        return [(name, t, calls) for name, (t, calls) in items[:n]]
+
+    def dump_chrome_trace(self, path):
+        """輸出可在 chrome://tracing 或 Perfetto 開啟的 JSON"""
+        with open(path, "w") as f:
+            json.dump({"traceEvents": list(self.trace_events), "displayTimeUnit": "ms"}, f)
+
+
+class ProfilerHUD:
+    """在 pygame 視窗左上角疊加 fps、p50/p99、視錐剔除統計、輸入延遲與最耗時的幾段"""
+    def __init__(self, profiler, top_n=5, font_size=16, view=None, latency=None):
+        import pygame
+        pygame.font.init()
+        self.profiler = profiler
+        self.view = view
+        # frame_pacing.InputLatency
+        self.latency = latency
+        self.top_n = top_n
+        self.font = pygame.font.SysFont("monospace", font_size)
+        self.line_height = self.font.get_linesize()
+
+    def lines(self):
+        p50, p99 = self.profiler.percentiles(50, 99)
+        lines = [f"fps {self.profiler.fps():6.1f}  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms"]
+        if self.view is not None and self.view.cull_stats:
+            stats = self.view.cull_stats
+            lines.append(f"cull: drawn {stats['drawn']} / tested {stats['tested']} / total {stats['total']}")
+        latency = self.latency.percentiles() if self.latency is not None else None
+        if latency is not None:
+            lines.append(f"input: p50 {latency[0]:6.2f} ms  p99 {latency[1]:6.2f} ms")
+        for name, t, calls in self.profiler.top_sections(self.top_n):
+            lines.append(f"{name:<22} {t * 1000:6.3f} ms {calls:4d} gl")
+        return lines
+
+    def draw(self, viewport_height):
+        import pygame
+        from OpenGL.GL import (glWindowPos2i, glDrawPixels, glEnable, glDisable, glBlendFunc,
+                               GL_RGBA, GL_UNSIGNED_BYTE, GL_BLEND, GL_DEPTH_TEST,
+                               GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        for i, line in enumerate(self.lines()):
+            surface = self.font.render(line, True, (255, 255, 255, 255), (0, 0, 0, 160))
+            data = pygame.image.tostring(surface, "RGBA", True)
+            y = viewport_height - (i + 1) * self.line_height
+            glWindowPos2i(4, max(y, 0))
+            glDrawPixels(surface.get_width(), surface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, data)
+        glDisable(GL_BLEND)
+        glEnable(GL_DEPTH_TEST)
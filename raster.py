@@ -0,0 +1,231 @@
+"""以 NumPy 在 CPU 上光柵化場景，不需要 OpenGL
+
+RasterCanvas 實作與 gl_backend.GLCanvas 相同的繪圖介面。
+繪製時只收集三角形與線段，end() 時一次完成所有三角形的設定、
+z-buffer 深度測試與上色，最後疊上線框。
+"""
+import numpy as np
+from camera import Camera
+from kinematics import local_matrices
+from mesh import mesh_cache, build_sphere_mesh
+
+# 每批最多產生的候選像素數，避免一次配置過大的陣列
+MAX_CANDIDATES = 1 << 21
+# 線框與面共平面，深度測試時給一點偏移
+LINE_DEPTH_BIAS = 1e-4
+
+
+def _to_bytes(color):
+    """0~1 的浮點顏色轉成 uint8"""
+    return np.clip(np.asarray(color, dtype=np.float32) * 255 + 0.5, 0, 255).astype(np.uint8)
+
+
+class RasterCanvas:
+    """軟體光柵化的繪圖介面，輸出 (H, W, 3) uint8 影像"""
+    def __init__(self, width=512, height=512, background=(0, 0, 0)):
+        self.width = width
+        self.height = height
+        self.background = _to_bytes(background)
+        self.image = np.zeros((height * width, 3), dtype=np.uint8)
+        self.depth = np.zeros(height * width, dtype=np.float32)
+        self.view_projection = np.eye(4)
+        self._stack = [np.eye(4)]
+        self._triangles = []
+        self._lines = []
+
+    # --- 繪圖介面 -------------------------------------------------------
+
+    def push_transform(self, translation, rotation):
+        self._stack.append(self._stack[-1] @ local_matrices([translation], [rotation])[0])
+
+    def push_matrix(self, matrix):
+        """matrix 為 row-major 的世界矩陣（kinematics.Kinematics.world）"""
+        self._stack.append(self._stack[-1] @ matrix)
+
+    def pop_transform(self):
+        self._stack.pop()
+
+    def draw_mesh(self, mesh, color, fill, wireframe_color):
+        clip = self._to_clip(mesh.vertices)
+        if fill:
+            self._triangles.append((clip[mesh.triangles.reshape(-1, 3)], color))
+        self._lines.append((clip[mesh.edges.reshape(-1, 2)], wireframe_color))
+
+    def draw_sphere(self, radius, slices, stacks, color, fill, wireframe_color):
+        mesh = mesh_cache.get(("sphere", radius, slices, stacks),
+                              lambda: build_sphere_mesh(radius, slices, stacks))
+        clip = self._to_clip(mesh.vertices)
+        if fill:
+            self._triangles.append((clip[mesh.triangles.reshape(-1, 3)], color))
+        else:
+            self._lines.append((clip[mesh.edges.reshape(-1, 2)], wireframe_color))
+
+    def draw_world_mesh(self, vertices, triangles, edges, colors, fill, wireframe_color):
+        """已經轉到世界座標的批次頂點（scene.MeshBatch）；edges 為 None 時不畫邊框"""
+        self._stack.append(np.eye(4))
+        clip = self._to_clip(vertices)
+        self._stack.pop()
+        if fill:
+            tris = triangles.reshape(-1, 3)
+            self._triangles.append((clip[tris], colors[tris[:, 0]]))
+        if edges is not None:
+            self._lines.append((clip[edges.reshape(-1, 2)], wireframe_color))
+
+    # --- 一幀的流程 -----------------------------------------------------
+
+    def begin(self, camera):
+        self.view_projection = camera.projection_matrix() @ camera.view_matrix()
+        self._stack = [np.eye(4)]
+        self._triangles = []
+        self._lines = []
+        self.image[:] = self.background
+        self.depth[:] = np.inf
+
+    def end(self):
+        if self._triangles:
+            tris = np.concatenate([t for t, _ in self._triangles])
+            colors = np.concatenate([np.broadcast_to(_to_bytes(c).reshape(-1, 3), (len(t), 3))
+                                     for t, c in self._triangles])
+            self._fill_triangles(tris, colors)
+        if self._lines:
+            lines = np.concatenate([l for l, _ in self._lines])
+            colors = np.concatenate([np.broadcast_to(_to_bytes(c), (len(l), 3))
+                                     for l, c in self._lines])
+            self._draw_lines(lines, colors)
+        return self.image.reshape(self.height, self.width, 3).copy()
+
+    # --- 內部實作 -------------------------------------------------------
+
+    def _to_clip(self, vertices):
+        m = (self.view_projection @ self._stack[-1]).astype(np.float32)
+        return vertices @ m[:, :3].T + m[:, 3]
+
+    def _to_screen(self, clip):
+        """clip 為齊次座標 (..., 4)，回傳螢幕座標 x, y（左上為原點）與深度 z"""
+        ndc = clip[..., :3] / clip[..., 3:]
+        x = (ndc[..., 0] * 0.5 + 0.5) * self.width
+        y = (0.5 - ndc[..., 1] * 0.5) * self.height
+        return x, y, ndc[..., 2]
+
+    def _fill_triangles(self, tris, colors):
+        # 有頂點在近平面後面的三角形直接捨棄
+        keep = np.all(tris[..., 3] > 1e-6, axis=1)
+        x, y, z = self._to_screen(tris[keep])
+        colors = colors[keep]
+
+        x0, x1, x2 = x[:, 0], x[:, 1], x[:, 2]
+        y0, y1, y2 = y[:, 0], y[:, 1], y[:, 2]
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        valid = np.abs(area) > 1e-9
+        area = np.where(valid, area, 1)
+        # 深度平面 z = z0 + dzdx * (x - x0) + dzdy * (y - y0)
+        dzdx = ((z[:, 1] - z[:, 0]) * (y2 - y0) - (z[:, 2] - z[:, 0]) * (y1 - y0)) / area
+        dzdy = ((z[:, 2] - z[:, 0]) * (x1 - x0) - (z[:, 1] - z[:, 0]) * (x2 - x0)) / area
+
+        # 每個三角形涵蓋的像素列（以像素中心判斷）
+        row_start = np.clip(np.ceil(y.min(axis=1) - 0.5), 0, self.height).astype(np.int64)
+        row_end = np.clip(np.ceil(y.max(axis=1) - 0.5), 0, self.height).astype(np.int64)
+        rows = np.where(valid, row_end - row_start, 0)
+        if rows.sum() == 0:
+            return
+
+        # 三角形設定：每一列算出左右邊界形成一段 span
+        tri = np.repeat(np.arange(len(rows)), rows)
+        py = row_start[tri] + np.arange(tri.size) - np.repeat(np.cumsum(rows) - rows, rows)
+        sy = py + 0.5
+        left = np.full(tri.size, np.inf, dtype=np.float32)
+        right = np.full(tri.size, -np.inf, dtype=np.float32)
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            ya, yb = y[tri, a], y[tri, b]
+            crosses = (np.minimum(ya, yb) <= sy) & (sy <= np.maximum(ya, yb)) & (ya != yb)
+            xa, xb = x[tri, a], x[tri, b]
+            t = (sy - ya) / np.where(ya != yb, yb - ya, 1)
+            xi = xa + (xb - xa) * t
+            left = np.where(crosses, np.minimum(left, xi), left)
+            right = np.where(crosses, np.maximum(right, xi), right)
+
+        span_start = np.clip(np.ceil(left - 0.5), 0, self.width).astype(np.int64)
+        span_end = np.clip(np.ceil(right - 0.5), 0, self.width).astype(np.int64)
+        lengths = np.maximum(span_end - span_start, 0)
+        total = int(lengths.sum())
+        if total == 0:
+            return
+        z_start = (z[tri, 0] + dzdx[tri] * (span_start + 0.5 - x0[tri])
+                   + dzdy[tri] * (sy - y0[tri])).astype(np.float32)
+
+        # 展開成像素，依數量分批
+        bounds = np.searchsorted(np.cumsum(lengths), np.arange(1, total // MAX_CANDIDATES + 1) * MAX_CANDIDATES)
+        for chunk in np.split(np.arange(tri.size), bounds):
+            n = lengths[chunk]
+            if n.sum() == 0:
+                continue
+            span = np.repeat(chunk, n)
+            step = np.arange(span.size) - np.repeat(np.cumsum(n) - n, n)
+            pixel = py[span] * self.width + span_start[span] + step
+            depth = (z_start[span] + dzdx[tri[span]] * step).astype(np.float32)
+            visible = (depth >= -1) & (depth <= 1)
+            self._write(pixel[visible], depth[visible], colors[tri[span[visible]]])
+
+    def _write(self, pixel, depth, colors):
+        """z-buffer：同一像素只保留最近的片段"""
+        np.minimum.at(self.depth, pixel, depth)
+        win = depth <= self.depth[pixel]
+        self.image[pixel[win]] = colors[win]
+
+    def _draw_lines(self, lines, colors):
+        keep = np.all(lines[..., 3] > 1e-6, axis=1)
+        x, y, z = self._to_screen(lines[keep])
+        colors = colors[keep]
+
+        dx = x[:, 1] - x[:, 0]
+        dy = y[:, 1] - y[:, 0]
+        counts = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64) + 1
+        # 完全在畫面外的線段不取樣
+        outside = ((x.max(axis=1) < 0) | (x.min(axis=1) >= self.width)
+                   | (y.max(axis=1) < 0) | (y.min(axis=1) >= self.height))
+        counts[outside] = 0
+        if counts.sum() == 0:
+            return
+
+        line = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(line.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = local / np.maximum(counts[line] - 1, 1)
+        px = np.floor(x[line, 0] + dx[line] * t).astype(np.int64)
+        py = np.floor(y[line, 0] + dy[line] * t).astype(np.int64)
+        depth = z[line, 0] + (z[line, 1] - z[line, 0]) * t
+        inside = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height) & (depth >= -1) & (depth <= 1)
+
+        pixel = py[inside] * self.width + px[inside]
+        depth = depth[inside].astype(np.float32)
+        line = line[inside]
+        visible = depth <= self.depth[pixel] + LINE_DEPTH_BIAS
+        self.image[pixel[visible]] = colors[line[visible]]
+
+
+class SoftwareRenderer:
+    """不需要 OpenGL 的備用渲染器，介面與 offscreen.OffscreenRenderer 相同"""
+    def __init__(self, width=512, height=512):
+        self.width = width
+        self.height = height
+        self.view = Camera(aspect=width / height)
+        self.canvas = RasterCanvas(width, height)
+
+    def render(self, robot):
+        kinematics = robot.kinematics
+        kinematics.update()
+        self.canvas.begin(self.view)
+        for node, world in zip(kinematics.nodes, kinematics.world):
+            if node.visible:
+                self.canvas.push_matrix(world)
+                node.draw(self.canvas)
+                self.canvas.pop_transform()
+        return self.canvas.end()
+
+    def render_scene(self, scene):
+        from components import Node
+        self.canvas.begin(self.view)
+        for batch in scene.update():
+            edges = batch.edges if batch.outline else None
+            self.canvas.draw_world_mesh(batch.vertices, batch.triangles, edges, batch.colors,
+                                        batch.fill, Node.wireframe_color)
+        return self.canvas.end()
@@ -1,10 +1,19 @@
-from components import Joint, Cube, Sphere, Cylinder, Wheel, Node
-from RobotView import RobotView
+from components import Joint, Cube, Sphere, Cylinder, Wheel, Node, collect_joints
+from pose import pose_store
+import numpy as np
+from kinematics import Kinematics
+from animation import Clip, Track
+
+# create_clips 的編譯結果
+_compiled_clips = {}
+
 
 class Robot:
-    def __init__(self):
-        # 初始化視圖
-        self.view = RobotView()
+    def __init__(self, create_view=True, scene_path=None):
+        # 視圖在第一次使用 self.view 時才建立，只建模型時不會載入 OpenGL 與 pygame
+        # （多台機器人的場景共用一個視圖，見 scene.py）
+        self.create_view = create_view
+        self._view = None
 
         self.state = 0
         self.robot_states = ["dinosaur", "car"]
@@ -13,8 +22,73 @@ class Robot:
 
         self.fill = True
         
+        if scene_path is not None:
+            # 從宣告式描述檔載入（見 scene_file.py）
+            self.load_structure(scene_path)
+            return
+
         # 創建機器人結構
         self.create_robot_structure()
+        # 名稱 -> 節點；其他模組依名稱找零件時使用，不依賴這裡的屬性名稱
+        self.nodes = {}
+        stack = [self.root_joint]
+        while stack:
+            node = stack.pop()
+            self.nodes[node.name] = node
+            stack.extend(node.children)
+        # 世界矩陣由 Kinematics 統一計算（從 body 開始繪製）
+        self.render_root = self.body
+        self.kinematics = Kinematics(self.render_root)
+        # 預先編譯好的變形動畫
+        self.clips = self.create_clips()
+        self.index_joints()
+
+    @property
+    def view(self):
+        if self._view is None and self.create_view:
+            from RobotView import RobotView
+            self._view = RobotView()
+        return self._view
+
+    @view.setter
+    def view(self, view):
+        self._view = view
+
+    def load_structure(self, path):
+        """從描述檔建立；節點只能以 self.nodes[名稱] 取得，不會變成屬性"""
+        import scene_file
+        model = scene_file.load(path)
+        self.nodes = model.nodes
+        self.root_joint = model.root
+        self.render_root = model.render_root
+        self.animated_joints = model.animated_joints
+        self.key_joints = model.key_joints
+        self.kinematics = Kinematics(self.render_root)
+        self.clips = model.clips
+        self.clip_sources = model.clip_sources
+        self.index_joints()
+
+    def index_joints(self):
+        """所有關節在 pose_store 中的位置，快照與還原時使用"""
+        self.joints = collect_joints(self.root_joint)
+        self.joint_ids = pose_store.select([joint.joint_id for joint in self.joints])
+
+    def snapshot(self):
+        """目前姿勢的複本（所有關節的角度、步數、狀態與 Robot 自己的狀態）"""
+        pose = pose_store.snapshot(self.joint_ids)
+        pose.robot_step = self.step
+        pose.robot_state = self.state
+        return pose
+
+    def restore(self, pose):
+        """還原快照，只有角度改變的關節會重新設定旋轉"""
+        changed = np.flatnonzero(pose_store.angles[self.joint_ids] != pose.angles)
+        pose_store.write(self.joint_ids, pose)
+        for i in changed:
+            self.joints[i].set_angle(float(pose.angles[i]))
+        self.step = pose.robot_step
+        self.state = pose.robot_state
+        self.robot_state = self.robot_states[self.state]
         
     def create_robot_structure(self):
         # 創建機器人節點樹
@@ -152,9 +226,34 @@ class Robot:
         self.tail.move(0, (self.tail.scale[1]/2), +(self.tail.scale[2]/2))
         self.tail_joint.add_child(self.tail)
 
+        # 變形時會一起轉動的關節
+        self.animated_joints = [self.root_joint, self.left_shoulder_joint, self.right_shoulder_joint,
+                                self.left_leg_joint, self.right_leg_joint, self.tail_joint]
+        # 依序由 z x c v b n 鍵控制的關節
+        self.key_joints = [self.root_joint, self.right_shoulder_joint, self.left_shoulder_joint,
+                           self.left_leg_joint, self.right_leg_joint, self.tail_joint]
+
         self.test_angle()
 
 
+    def create_clips(self, fps=60, duration=2.0, stagger=0.15):
+        """變形動畫 to_car / to_dinosaur：各關節依序錯開開始"""
+        to_car, to_dinosaur = [], []
+        for i, joint in enumerate(self.animated_joints):
+            start = i * stagger
+            end = start + duration
+            to_car.append(Track(joint.name, [(start, joint.min_angle), (end, joint.max_angle)], "ease_in_out"))
+            to_dinosaur.append(Track(joint.name, [(start, joint.max_angle), (end, joint.min_angle)], "ease_in_out"))
+        clips = [Clip("to_car", to_car), Clip("to_dinosaur", to_dinosaur)]
+        # 未編譯的片段，匯出描述檔時使用
+        self.clip_sources = {clip.name: clip for clip in clips}
+        # 關節範圍相同的機器人共用編譯結果（CompiledClip 不會被修改）
+        key = (fps, duration, stagger,
+               tuple((joint.name, joint.min_angle, joint.max_angle, joint.angle) for joint in self.animated_joints))
+        if key not in _compiled_clips:
+            _compiled_clips[key] = {clip.name: clip.compile(self.animated_joints, fps) for clip in clips}
+        return _compiled_clips[key]
+
     def test_angle(self):
         pass
         # 測試 root_joint 的旋轉
@@ -166,15 +265,34 @@ class Robot:
     def change_state(self):
         self.state = (self.state + 1) % len(self.robot_states)
         self.robot_state = self.robot_states[self.state]
-        joints = [self.root_joint, self.left_shoulder_joint, self.right_shoulder_joint, self.left_leg_joint, self.right_leg_joint, self.tail_joint]
-        for joint in joints:
+        for joint in self.animated_joints:
             joint.set_state(self.robot_state)
 
+    def sync_steps(self):
+        """關節角度被直接設定（例如播放動畫）後，依角度重新推算 step 與 state
+
+        每個關節取最接近的第 k 步（共 20 步）；多數關節過半時視為 car，之後的
+        all_add_step 從第 k 步往回走，否則為 dinosaur 往前走，不會跳回原本的 step。
+        """
+        fractions = []
+        for joint in self.animated_joints:
+            span = joint.max_angle - joint.min_angle
+            fractions.append((joint.angle - joint.min_angle) / span if span else 0.0)
+        if not fractions:
+            return
+        self.state = self.robot_states.index("car") if np.mean(fractions) >= 0.5 else self.robot_states.index("dinosaur")
+        self.robot_state = self.robot_states[self.state]
+        # add_step 先設定第 step 步的角度再前進，所以下一步是 k + 1（car 為 k - 1）
+        direction = 1 if self.robot_state == "dinosaur" else -1
+        for joint, fraction in zip(self.animated_joints, fractions):
+            joint.set_state(self.robot_state)
+            joint.step = int(round(fraction * 20)) + direction
+        self.step = int(round(np.mean(fractions) * 20)) + direction
+
     def change_fill(self):
-        objects = [self.body, self.head, self.mouth, self.eye_left, self.eye_right, self.left_hand, self.right_hand, 
-                   self.pelvis, self.left_leg, self.right_leg, self.front_left_wheel, self.front_right_wheel, self.back_left_wheel, self.back_right_wheel,
-                   self.tail]
-        
+        # 關節本身不畫，只切換其他零件
+        objects = [node for node in self.kinematics.nodes if not isinstance(node, Joint)]
+
         self.fill = not self.fill
         Node.wireframe_color = (0, 0, 0) if self.fill else (173/255, 217/255, 0)
 
@@ -201,6 +319,5 @@ class Robot:
         elif self.robot_state == "car":
             self.step -= 1
         
-        joints = [self.root_joint, self.left_shoulder_joint, self.right_shoulder_joint, self.left_leg_joint, self.right_leg_joint, self.tail_joint]
-        for joint in joints:
+        for joint in self.animated_joints:
             joint.add_step()
\ No newline at end of file
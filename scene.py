@@ -0,0 +1,114 @@
+import numpy as np
+from components import Node, has_outline
+from kinematics import rotation_matrices
+from robot import Robot
+
+
+def placement_matrix(position=(0, 0, 0), heading=0):
+    """機器人在場景中的位置與繞 y 軸的朝向（度）"""
+    m = rotation_matrices([(heading, 0, 1, 0)])[0]
+    m[:3, 3] = position
+    return m
+
+
+class MeshBatch:
+    """同一個網格、同一種填充模式的所有零件，合併成一次繪製
+
+    outline 為是否畫邊框，規則與單獨繪製時相同（components.has_outline）。
+    """
+    def __init__(self, mesh, fill, outline, world_indices, colors):
+        self.mesh = mesh
+        self.fill = fill
+        self.outline = outline
+        # 在 Scene 所有節點世界矩陣中的位置
+        self.world_indices = np.asarray(world_indices, dtype=np.intp)
+        count = len(self.world_indices)
+        n = len(mesh.vertices)
+        offsets = (np.arange(count, dtype=np.uint32) * n)[:, None]
+        self.triangles = (mesh.triangles[None, :] + offsets).ravel()
+        self.edges = (mesh.edges[None, :] + offsets).ravel()
+        self.colors = np.repeat(np.asarray(colors, dtype=np.float32), n, axis=0)
+        self.vertices = np.zeros((count * n, 3), dtype=np.float32)
+
+    def update(self, world):
+        """用最新的世界矩陣在 CPU 上一次轉換所有實例的頂點"""
+        m = world[self.world_indices].astype(np.float32)
+        out = self.vertices.reshape(len(m), -1, 3)
+        np.matmul(self.mesh.vertices, m[:, :3, :3].transpose(0, 2, 1), out=out)
+        out += m[:, None, :3, 3]
+
+
+class Scene:
+    """多台機器人共用一個相機，相同零件按網格批次繪製
+
+    每台機器人有自己的姿勢 (Robot.kinematics) 與場景中的擺放矩陣。
+    繪製次數只跟不同網格的數量有關，與機器人數量無關。
+    """
+    def __init__(self):
+        self.robots = []
+        self.placements = []
+        self.batches = []
+        self._layout_key = None
+
+    def add_robot(self, robot=None, position=(0, 0, 0), heading=0):
+        if robot is None:
+            robot = Robot(create_view=False)
+        self.robots.append(robot)
+        self.placements.append(placement_matrix(position, heading))
+        self._layout_key = None
+        return robot
+
+    def set_placement(self, index, position=(0, 0, 0), heading=0):
+        self.placements[index] = placement_matrix(position, heading)
+        Node.revision += 1
+
+    @classmethod
+    def grid(cls, count, spacing=12.0):
+        """把 count 台機器人排成方陣"""
+        scene = cls()
+        columns = int(np.ceil(np.sqrt(count)))
+        for i in range(count):
+            row, column = divmod(i, columns)
+            x = (column - (columns - 1) / 2) * spacing
+            z = -row * spacing
+            scene.add_robot(position=(x, 0, z))
+        return scene
+
+    def _build_layout(self):
+        """依 (網格, 填充, 邊框) 把所有機器人的可見零件分組"""
+        groups = {}
+        offset = 0
+        for robot in self.robots:
+            nodes = robot.kinematics.nodes
+            for i, node in enumerate(nodes):
+                if not node.visible:
+                    continue
+                mesh = node.get_mesh()
+                if mesh is None:
+                    continue
+                key = (node.mesh_key(), node.fill, has_outline(node))
+                group = groups.setdefault(key, (mesh, [], []))
+                group[1].append(offset + i)
+                group[2].append(node.color)
+            offset += len(nodes)
+        self.batches = [MeshBatch(mesh, key[1], key[2], indices, colors)
+                        for key, (mesh, indices, colors) in groups.items()]
+
+    def world_matrices(self):
+        """所有機器人所有節點的場景世界矩陣，依機器人順序串接"""
+        return np.concatenate([placement @ robot.kinematics.world
+                               for robot, placement in zip(self.robots, self.placements)])
+
+    def update(self):
+        """更新姿勢並重新轉換批次頂點，回傳要繪製的 MeshBatch 列表"""
+        for robot in self.robots:
+            robot.kinematics.update()
+        layout_key = (len(self.robots), Node.style_revision)
+        if layout_key != self._layout_key:
+            self._build_layout()
+            self._layout_key = layout_key
+
+        world = self.world_matrices()
+        for batch in self.batches:
+            batch.update(world)
+        return self.batches
@@ -0,0 +1,472 @@
+"""宣告式的場景描述檔（JSON 或 TOML）與二進位快取
+
+    python scene_file.py export robot.json     # 把 Robot.create_robot_structure 匯出成描述檔
+    python scene_file.py load robot.json       # 量測載入時間（第二次起使用快取）
+
+描述檔格式：
+
+    {
+      "root": "root_joint",          # 可省略，預設為 nodes 第一層
+      "render_root": "body",         # Kinematics 從哪個節點開始繪製，可省略
+      "animated": ["root_joint", ...],
+      "keys": ["root_joint", ...],   # 依序由 z x c v b n m 鍵控制的關節，可省略，預設為 animated
+      "fps": 60,
+      "clips": {"to_car": {"tracks": [{"joint": "root_joint", "keys": [[0, 0], [2, 45]],
+                                       "easing": "ease_in_out"}]}},
+      "nodes": {"type": "joint", "name": "root_joint", "angle_limit": [0, 45], "axis": [-1, 0, 0],
+                "children": [{"type": "cube", "name": "body", "scale": [2.5, 1.5, 5], ...}]}
+    }
+
+節點共通的欄位：translation、rotation、color、fill、visible、children，省略時使用預設值。
+cube 用 scale 加上 offset（等同 Cube.move），或直接給 vertices。
+
+第一次載入後會在旁邊寫一個 <檔名>.cache.npz，內容是攤平的節點參數、網格與編譯好的動畫，
+描述檔內容沒變時直接從快取建立節點樹，不再解析巢狀結構、重算網格和取樣動畫。
+"""
+import gc
+import hashlib
+import json
+import os
+import sys
+import time
+import numpy as np
+from components import Node, Cube, Sphere, Joint, Wheel, Cylinder
+from mesh import Mesh, mesh_cache
+from animation import Clip, CompiledClip, Track
+
+NODE_TYPES = {
+    "node": Node,
+    "cube": Cube,
+    "sphere": Sphere,
+    "joint": Joint,
+    "wheel": Wheel,
+    "cylinder": Cylinder,
+}
+TYPE_NAMES = list(NODE_TYPES)
+
+# 快取中每個節點的形狀參數欄數（cube 的 scale 3 + 頂點 24 最多）
+PARAM_WIDTH = 27
+CACHE_VERSION = 2
+
+
+class SceneModel:
+    """載入完成的場景：節點樹、依名稱查詢的節點、動畫關節、按鍵控制的關節與動畫
+
+    clips 為編譯好的 CompiledClip，clip_sources 為未編譯的 Clip（匯出描述檔時使用）。
+    """
+    def __init__(self, root, render_root, nodes, animated_joints, key_joints, clips, clip_sources):
+        self.root = root
+        self.render_root = render_root
+        self.nodes = nodes
+        self.animated_joints = animated_joints
+        self.key_joints = key_joints
+        self.clips = clips
+        self.clip_sources = clip_sources
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+
+def read_description(path):
+    """依副檔名讀取 JSON 或 TOML"""
+    with open(path, "rb") as f:
+        data = f.read()
+    return parse_description(data, path), data
+
+
+def parse_description(data, path=""):
+    if path.endswith(".toml"):
+        import tomllib
+        return tomllib.loads(data.decode("utf-8"))
+    return json.loads(data)
+
+
+def _type_name(node):
+    for name, cls in NODE_TYPES.items():
+        if type(node) is cls:
+            return name
+    raise ValueError(f"無法描述的節點類型: {type(node).__name__}")
+
+
+# ---- 描述檔 -> 節點樹 ----
+
+def build_node(spec, nodes):
+    """依描述建立節點（含子節點），nodes 收集 名稱 -> 節點"""
+    kind = spec.get("type", "node")
+    if kind not in NODE_TYPES:
+        raise ValueError(f"未知的節點類型: {kind}")
+    name = spec["name"]
+    if name in nodes:
+        raise ValueError(f"節點名稱重複: {name}")
+
+    if kind == "cube":
+        node = Cube(name, scale=tuple(spec.get("scale", (1, 1, 1))))
+        if "vertices" in spec:
+            node.vertices = [list(v) for v in spec["vertices"]]
+        elif "offset" in spec:
+            node.move(*spec["offset"])
+    elif kind == "sphere":
+        node = Sphere(name, radius=spec.get("radius", 0.5),
+                      slices=spec.get("slices", 16), stacks=spec.get("stacks", 16))
+    elif kind == "joint":
+        node = Joint(name, angle_limit=tuple(spec.get("angle_limit", (-360, 360))),
+                     axis=list(spec.get("axis", (0, 0, 1))), radius=spec.get("radius", 0.5))
+    elif kind == "wheel":
+        node = Wheel(name, inner_radius=spec.get("inner_radius", 0.3),
+                     outer_radius=spec.get("outer_radius", 0.5),
+                     height=spec.get("height", 0.2), segments=spec.get("segments", 32))
+    elif kind == "cylinder":
+        node = Cylinder(name, radius=spec.get("radius", 0.5), height=spec.get("height", 1.0),
+                        segments=spec.get("segments", 32))
+    else:
+        node = Node(name)
+    nodes[name] = node
+    if kind == "joint" and "angle" in spec:
+        node.set_angle(spec["angle"])
+
+    if "translation" in spec:
+        node.set_translation(*spec["translation"])
+    if "rotation" in spec:
+        node.set_rotation(*spec["rotation"])
+    if "color" in spec:
+        node.set_color(*spec["color"])
+    if "fill" in spec:
+        node.set_fill(spec["fill"])
+    if "visible" in spec:
+        node.visible = spec["visible"]
+
+    # 子節點的旋轉照描述設定，不由關節角度覆蓋（與 Robot 中先設角度再加子節點的行為相同）
+    for child in spec.get("children", ()):
+        node.add_child(build_node(child, nodes))
+    return node
+
+
+def build_clips(specs):
+    """描述中的 clips -> {名稱: Clip}"""
+    clips = {}
+    for name, spec in specs.items():
+        tracks = [Track(track["joint"], [tuple(key) for key in track["keys"]],
+                        track.get("easing", "linear"))
+                  for track in spec["tracks"]]
+        clips[name] = Clip(name, tracks, spec.get("duration"))
+    return clips
+
+
+def build_model(description):
+    nodes = {}
+    root = build_node(description["nodes"], nodes)
+    render_root = nodes[description.get("render_root", root.name)]
+    animated = description.get("animated", ())
+    animated_joints = [nodes[name] for name in animated]
+    key_joints = [nodes[name] for name in description.get("keys", animated)]
+    fps = description.get("fps", 60)
+    sources = build_clips(description.get("clips", {}))
+    clips = {name: clip.compile(animated_joints, fps) for name, clip in sources.items()}
+    return SceneModel(root, render_root, nodes, animated_joints, key_joints, clips, sources)
+
+
+# ---- 節點樹 -> 描述檔 ----
+
+def describe_node(node):
+    """把節點樹轉回描述，只寫出和預設值不同的欄位"""
+    kind = _type_name(node)
+    spec = {"type": kind, "name": node.name}
+    if kind == "cube":
+        spec["scale"] = list(node.scale)
+        base = np.array(node.initial_vertices) * np.array(node.scale)
+        vertices = np.array(node.vertices)
+        offset = (vertices - base).mean(axis=0)
+        if np.allclose(base + offset, vertices):
+            if np.any(offset != 0):
+                spec["offset"] = offset.tolist()
+        else:
+            spec["vertices"] = vertices.tolist()
+    elif kind == "sphere":
+        spec.update(radius=node.radius, slices=node.slices, stacks=node.stacks)
+    elif kind == "joint":
+        spec.update(angle_limit=[node.min_angle, node.max_angle], axis=list(node.axis),
+                    radius=node.radius)
+        if node.angle != node.min_angle:
+            spec["angle"] = node.angle
+    elif kind == "wheel":
+        spec.update(inner_radius=node.inner_radius, outer_radius=node.outer_radius,
+                    height=node.height, segments=node.segments)
+    elif kind == "cylinder":
+        spec.update(radius=node.radius, height=node.height, segments=node.segments)
+
+    if any(node.translation):
+        spec["translation"] = list(node.translation)
+    # 關節的旋轉由關節角度決定
+    if kind != "joint" and node.rotation[0] != 0:
+        spec["rotation"] = list(node.rotation)
+    if tuple(node.color) != (1.0, 1.0, 1.0):
+        spec["color"] = list(node.color)
+    if kind != "joint":
+        if not node.fill:
+            spec["fill"] = False
+        if not node.visible:
+            spec["visible"] = False
+    if node.children:
+        spec["children"] = [describe_node(child) for child in node.children]
+    return spec
+
+
+def describe_clips(clip_sources):
+    """{名稱: Clip} -> 描述中的 clips"""
+    clips = {}
+    for name, clip in clip_sources.items():
+        clips[name] = {"tracks": [{"joint": track.joint_name,
+                                   "keys": [[float(t), float(a)] for t, a in zip(track.times, track.angles)],
+                                   "easing": track.easing_name}
+                                  for track in clip.tracks]}
+        if clip.duration != max(track.end_time for track in clip.tracks):
+            clips[name]["duration"] = float(clip.duration)
+    return clips
+
+
+def describe_robot(robot, fps=60):
+    """把 robot.Robot 的結構與變形動畫匯出成描述"""
+    description = {
+        "root": robot.root_joint.name,
+        "render_root": robot.render_root.name,
+        "animated": [joint.name for joint in robot.animated_joints],
+        "fps": fps,
+        "clips": describe_clips(robot.clip_sources),
+        "nodes": describe_node(robot.root_joint),
+    }
+    keys = [joint.name for joint in robot.key_joints]
+    if keys != description["animated"]:
+        description["keys"] = keys
+    return description
+
+
+# ---- 二進位快取 ----
+
+def cache_path(path):
+    return path + ".cache.npz"
+
+
+def _flatten(root):
+    """前序攤平，回傳 (節點, parent 索引)"""
+    order, parents = [], []
+    stack = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(order)
+        order.append(node)
+        parents.append(parent)
+        for child in reversed(node.children):
+            stack.append((child, index))
+    return order, parents
+
+
+def _params(node):
+    kind = type(node)
+    if kind is Cube:
+        return list(node.scale) + [c for vertex in node.vertices for c in vertex]
+    if kind is Joint:
+        return [node.radius, node.min_angle, node.max_angle, *node.axis, node.angle]
+    if kind is Sphere:
+        return [node.radius, node.slices, node.stacks]
+    if kind is Wheel:
+        return [node.inner_radius, node.outer_radius, node.height, node.segments]
+    if kind is Cylinder:
+        return [node.radius, node.height, node.segments]
+    return []
+
+
+def write_cache(path, model, source):
+    order, parents = _flatten(model.root)
+    n = len(order)
+    index = {id(node): i for i, node in enumerate(order)}
+    params = np.zeros((n, PARAM_WIDTH))
+    for i, node in enumerate(order):
+        values = _params(node)
+        params[i, :len(values)] = values
+
+    # 相同形狀的網格只存一份
+    mesh_keys, mesh_of = {}, np.full(n, -1, dtype=np.int32)
+    meshes = []
+    for i, node in enumerate(order):
+        key = node.mesh_key()
+        if key is None:
+            continue
+        if key not in mesh_keys:
+            mesh_keys[key] = len(meshes)
+            meshes.append(node.get_mesh())
+        mesh_of[i] = mesh_keys[key]
+
+    def concat(name):
+        arrays = [getattr(mesh, name) for mesh in meshes]
+        offsets = np.cumsum([0] + [len(a) for a in arrays])
+        return (np.concatenate(arrays) if arrays else np.zeros(0)), offsets
+
+    vertices, vertex_offsets = concat("vertices")
+    triangles, triangle_offsets = concat("triangles")
+    edges, edge_offsets = concat("edges")
+
+    clips = list(model.clips.values())
+    arrays = dict(
+        version=np.array(CACHE_VERSION),
+        source_hash=np.array(hashlib.sha1(source).hexdigest()),
+        names=np.array([node.name for node in order]),
+        types=np.array([TYPE_NAMES.index(_type_name(node)) for node in order], dtype=np.int8),
+        parents=np.array(parents, dtype=np.int32),
+        translations=np.array([node.translation for node in order], dtype=np.float64),
+        rotations=np.array([node.rotation for node in order], dtype=np.float64),
+        colors=np.array([node.color for node in order], dtype=np.float64),
+        fill=np.array([node.fill for node in order]),
+        visible=np.array([node.visible for node in order]),
+        params=params,
+        render_root=np.array(index[id(model.render_root)]),
+        animated=np.array([index[id(joint)] for joint in model.animated_joints], dtype=np.int32),
+        keys=np.array([index[id(joint)] for joint in model.key_joints], dtype=np.int32),
+        # 未編譯的動畫只有少數幾個關鍵影格，存成描述檔的格式
+        clip_sources=np.array(json.dumps(describe_clips(model.clip_sources))),
+        mesh_of=mesh_of,
+        mesh_vertices=vertices, mesh_vertex_offsets=vertex_offsets,
+        mesh_triangles=triangles, mesh_triangle_offsets=triangle_offsets,
+        mesh_edges=edges, mesh_edge_offsets=edge_offsets,
+        clip_names=np.array([clip.name for clip in clips]),
+        clip_fps=np.array([clip.fps for clip in clips], dtype=np.float64),
+    )
+    for i, clip in enumerate(clips):
+        arrays[f"clip_frames_{i}"] = clip.frames
+        arrays[f"clip_animated_{i}"] = clip.animated
+    # 先寫暫存檔再改名，避免讀到寫到一半的快取
+    temp = path + ".tmp.npz"
+    np.savez(temp, **arrays)
+    os.replace(temp, path)
+
+
+def _node_from_cache(kind, name, p):
+    if kind == "cube":
+        node = Cube(name, scale=(p[0], p[1], p[2]), vertices=[p[3:6], p[6:9], p[9:12], p[12:15],
+                                                               p[15:18], p[18:21], p[21:24], p[24:27]])
+    elif kind == "joint":
+        node = Joint(name, angle_limit=(p[1], p[2]), axis=p[3:6], radius=p[0])
+    elif kind == "sphere":
+        node = Sphere(name, radius=p[0], slices=int(p[1]), stacks=int(p[2]))
+    elif kind == "wheel":
+        node = Wheel(name, inner_radius=p[0], outer_radius=p[1], height=p[2], segments=int(p[3]))
+    elif kind == "cylinder":
+        node = Cylinder(name, radius=p[0], height=p[1], segments=int(p[2]))
+    else:
+        node = Node(name)
+    return node
+
+
+def read_cache(path, source):
+    """快取有效時建立 SceneModel，否則回傳 None"""
+    try:
+        data = np.load(path)
+    except (OSError, ValueError):
+        return None
+    with data:
+        if int(data["version"]) != CACHE_VERSION or str(data["source_hash"]) != hashlib.sha1(source).hexdigest():
+            return None
+        names = data["names"].tolist()
+        types = data["types"].tolist()
+        parents = data["parents"].tolist()
+        params = data["params"].tolist()
+        translations = data["translations"].tolist()
+        rotations = data["rotations"].tolist()
+        colors = data["colors"].tolist()
+        fill = data["fill"].tolist()
+        visible = data["visible"].tolist()
+
+        order = []
+        for i, name in enumerate(names):
+            kind = TYPE_NAMES[types[i]]
+            node = _node_from_cache(kind, name, params[i])
+            node.translation = translations[i]
+            node.rotation = rotations[i]
+            node.color = tuple(colors[i])
+            node.fill = fill[i]
+            node.visible = visible[i]
+            if kind == "joint":
+                node.angle = params[i][6]
+            if parents[i] >= 0:
+                order[parents[i]].add_child(node)
+            order.append(node)
+
+        # 預先放進網格快取，節點第一次繪製時不必重新細分
+        mesh_of = data["mesh_of"]
+        vertex_offsets = data["mesh_vertex_offsets"]
+        triangle_offsets = data["mesh_triangle_offsets"]
+        edge_offsets = data["mesh_edge_offsets"]
+        vertices, triangles, edges = data["mesh_vertices"], data["mesh_triangles"], data["mesh_edges"]
+        # 每個網格取第一個使用它的節點
+        used, first = np.unique(mesh_of, return_index=True)
+        for m, i in zip(used.tolist(), first.tolist()):
+            if m < 0:
+                continue
+            mesh = Mesh(vertices[vertex_offsets[m]:vertex_offsets[m + 1]],
+                        triangles[triangle_offsets[m]:triangle_offsets[m + 1]],
+                        edges[edge_offsets[m]:edge_offsets[m + 1]])
+            mesh_cache.get(order[i].mesh_key(), lambda: mesh)
+
+        animated_joints = [order[i] for i in data["animated"]]
+        key_joints = [order[i] for i in data["keys"]]
+        clip_sources = build_clips(json.loads(str(data["clip_sources"])))
+        clips = {}
+        for i, (name, fps) in enumerate(zip(data["clip_names"].tolist(), data["clip_fps"].tolist())):
+            clips[name] = CompiledClip(name, data[f"clip_frames_{i}"], fps, data[f"clip_animated_{i}"])
+        render_root = order[int(data["render_root"])]
+
+    nodes = {node.name: node for node in order}
+    return SceneModel(order[0], render_root, nodes, animated_joints, key_joints, clips, clip_sources)
+
+
+def load(path, use_cache=True):
+    """載入描述檔，內容沒變時使用 .cache.npz"""
+    with open(path, "rb") as f:
+        source = f.read()
+    # 大量建立節點時暫停循環垃圾回收，否則會被反覆觸發
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        cache = cache_path(path)
+        if use_cache and os.path.exists(cache):
+            model = read_cache(cache, source)
+            if model is not None:
+                return model
+
+        model = build_model(parse_description(source, path))
+        if use_cache:
+            try:
+                write_cache(cache, model, source)
+            except OSError:
+                pass
+        return model
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "load"):
+        print(__doc__)
+        return
+    command, path = sys.argv[1], sys.argv[2]
+    if command == "export":
+        from robot import Robot
+        with open(path, "w") as f:
+            json.dump(describe_robot(Robot(create_view=False)), f, indent=2)
+        print(f"已寫入 {path}")
+        return
+
+    if os.path.exists(cache_path(path)):
+        os.remove(cache_path(path))
+    for label, use_cache in (("parse", False), ("parse + write cache", True), ("cache", True)):
+        mesh_cache.clear()
+        start = time.perf_counter()
+        model = load(path, use_cache)
+        # 包含第一次取得網格的時間（沒有快取時要在這裡細分）
+        for node in model.nodes.values():
+            node.get_mesh()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<20} {len(model.nodes)} 個節點, {elapsed * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    main()
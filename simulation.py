@@ -0,0 +1,138 @@
+import numpy as np
+from animation import ClipPlayer
+from components import collect_joints
+from pose import pose_store
+
+
+class SimulationClock:
+    """固定步長的模擬時鐘，把經過的時間換算成要執行的 tick 數"""
+    def __init__(self, tick_rate=60, max_ticks_per_frame=10):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.accumulator = 0.0
+        self.ticks = 0
+
+    def advance(self, elapsed):
+        """累積 elapsed 秒，回傳這一幀要執行的 tick 數"""
+        self.accumulator += elapsed
+        ticks = int(self.accumulator / self.dt)
+        if ticks > self.max_ticks_per_frame:
+            # 落後太多（例如視窗被拖動）時丟掉多餘的時間，避免越追越慢
+            ticks = self.max_ticks_per_frame
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.dt
+        self.ticks += ticks
+        return ticks
+
+    @property
+    def alpha(self):
+        """目前時間落在最後兩個 tick 之間的比例 (0 ~ 1)"""
+        return min(self.accumulator / self.dt, 1.0)
+
+
+class Simulation:
+    """以固定頻率推進關節狀態，畫面則在最後兩個狀態之間內插"""
+    def __init__(self, robot, tick_rate=60, auto_step_rate=10):
+        self.robot = robot
+        self.clock = SimulationClock(tick_rate)
+        self.auto_stepping = False
+        self.auto_step_interval = max(1, round(tick_rate / auto_step_rate))
+        self._auto_ticks = 0
+        # 每個 tick 呼叫 rotate() 的關節（按住的按鍵）
+        self.held_joints = []
+        # 關鍵影格動畫（Robot.clips）
+        self.player = ClipPlayer(robot.animated_joints)
+        # pose_log.PoseRecorder，每個 tick 結束時記錄一筆
+        self.recorder = None
+        # control.ControlServer，每個 tick 開始時套用合併後的外部指令
+        self.control = None
+
+        self.joints = collect_joints(robot.root_joint)
+        self.joint_ids = pose_store.select([joint.joint_id for joint in self.joints])
+        self.current = self._angles()
+        self.previous = self.current.copy()
+        self._interpolated = False
+
+    def _angles(self):
+        return pose_store.angles[self.joint_ids].astype(np.float64)
+
+    def _restore(self):
+        """把內插用的顯示角度還原成模擬角度"""
+        if not self._interpolated:
+            return
+        for joint, angle in zip(self.joints, self.current):
+            if joint.angle != angle:
+                joint.set_angle(float(angle))
+        self._interpolated = False
+
+    def tick(self):
+        """執行一個固定步長"""
+        self.previous = self.current
+        if self.control is not None:
+            self.control.apply()
+        if self.auto_stepping:
+            if self._auto_ticks % self.auto_step_interval == 0:
+                self.robot.all_add_step()
+            self._auto_ticks += 1
+        else:
+            self._auto_ticks = 0
+        for joint in self.held_joints:
+            joint.rotate()
+        if self.player.playing:
+            self.player.advance(self.clock.dt)
+            self.player.apply()
+            if not self.player.playing:
+                # 播放結束，之後的 all_add_step 從動畫停下的角度接著走
+                self.robot.sync_steps()
+        self.current = self._angles()
+        if self.recorder is not None:
+            self.recorder.record()
+
+    def nudge(self, joint, delta):
+        """直接轉動單一關節 delta 度（例如滑鼠滾輪），不經過內插"""
+        self._restore()
+        joint.set_angle(joint.angle + delta)
+        # 與動畫播放結束相同，之後的 all_add_step 從轉過的角度接著走
+        self.robot.sync_steps()
+        self.sync()
+
+    def sync(self):
+        """關節被外部直接設定（例如重播錄製檔）後，以目前角度作為模擬狀態"""
+        self._interpolated = False
+        self.current = self._angles()
+        self.previous = self.current.copy()
+
+    def play_clip(self, name, speed=1.0, fade=0.0):
+        self.player.play(self.robot.clips[name], speed=speed, fade=fade)
+
+    def run_ticks(self, count):
+        """不繪圖直接推進 count 個 tick（可用於離線模擬）"""
+        self._restore()
+        for _ in range(count):
+            self.tick()
+        self.previous = self.current.copy()
+
+    def in_motion(self):
+        """最後一個 tick 是否有關節在動"""
+        return bool(np.any(self.previous != self.current))
+
+    def advance(self, elapsed):
+        """推進 elapsed 秒並把關節設為內插後的角度，回傳執行的 tick 數"""
+        ticks = self.clock.advance(elapsed)
+        if ticks:
+            self._restore()
+            for _ in range(ticks):
+                self.tick()
+        self.interpolate(self.clock.alpha)
+        return ticks
+
+    def interpolate(self, alpha):
+        moving = np.flatnonzero(self.previous != self.current)
+        if moving.size == 0:
+            return
+        angles = self.previous + (self.current - self.previous) * alpha
+        for i in moving:
+            self.joints[i].set_angle(float(angles[i]))
+        self._interpolated = True
@@ -0,0 +1,256 @@
+"""以 GLSL 著色器一次畫完整台機器人（GPU skinning）
+
+    python skinning.py                 # 離屏比較固定管線與著色器路徑的畫面、draw call 與時間
+
+所有零件都是剛體，所以和 gl_backend.DisplayListCache 一樣依 rigid_groups 分組：
+每個群組是一根「骨頭」，頂點預先轉換到群組 root 的座標並帶著骨頭索引，
+合併成一個頂點緩衝區。每幀只上傳各群組 root 的世界矩陣（uniform mat4 陣列），
+再以一次 GL_TRIANGLES 與一次 GL_LINES 畫完。
+
+著色器使用 GLSL 1.20 與相容性設定檔的 gl_ModelViewProjectionMatrix，
+相機仍由 RobotView.apply_camera 設定，Mesa llvmpipe 也能執行。
+"""
+if __name__ == '__main__':
+    # 直接執行時使用 EGL 離屏 context，必須在載入 OpenGL 之前
+    import offscreen
+import ctypes
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+import numpy as np
+from components import Node, Sphere
+from kinematics import rigid_groups, group_relative_matrices
+
+VERTEX_SHADER = """
+#version 120
+uniform mat4 bones[%d];
+uniform vec4 line_color;
+attribute vec3 position;
+attribute vec3 color;
+attribute float bone;
+varying vec3 v_color;
+
+void main() {
+    // line_color.a 為 1 時（畫邊框）改用統一的線框顏色
+    v_color = mix(color, line_color.rgb, line_color.a);
+    gl_Position = gl_ModelViewProjectionMatrix * (bones[int(bone)] * vec4(position, 1.0));
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 120
+varying vec3 v_color;
+
+void main() {
+    gl_FragColor = vec4(v_color, 1.0);
+}
+"""
+
+
+def merge_geometry(kinematics):
+    """把所有可見零件合併成 (頂點 (n, 7)：位置、顏色、骨頭索引, 三角形索引, 線段索引, 骨頭 root)
+
+    與固定管線的繪製方式相同：有網格的零件實心時畫三角形、一律畫邊框；
+    球體實心時只畫三角形，否則只畫線。
+    """
+    kinematics.update()
+    nodes = kinematics.nodes
+    groups = rigid_groups(kinematics)
+    vertices, triangles, edges, bones = [], [], [], []
+    count = 0
+    for root, members in groups.items():
+        relative = group_relative_matrices(kinematics, members)
+        bone = len(bones)
+        used = False
+        for i in members:
+            node = nodes[i]
+            mesh = node.get_mesh() if node.visible else None
+            if mesh is None or len(mesh.vertices) == 0:
+                continue
+            m = relative[i]
+            position = mesh.vertices @ m[:3, :3].T.astype(np.float32) + m[:3, 3].astype(np.float32)
+            block = np.empty((len(position), 7), dtype=np.float32)
+            block[:, :3] = position
+            block[:, 3:6] = node.color
+            block[:, 6] = bone
+            vertices.append(block)
+            sphere = isinstance(node, Sphere)
+            if node.fill:
+                triangles.append(mesh.triangles + count)
+            if not (sphere and node.fill):
+                edges.append(mesh.edges + count)
+            count += len(position)
+            used = True
+        if used:
+            bones.append(root)
+
+    def join(parts, dtype, shape):
+        return np.ascontiguousarray(np.concatenate(parts), dtype=dtype) if parts else np.zeros(shape, dtype=dtype)
+
+    return (join(vertices, np.float32, (0, 7)), join(triangles, np.uint32, 0),
+            join(edges, np.uint32, 0), np.array(bones, dtype=np.intp))
+
+
+class SkinnedRenderer:
+    """著色器繪製路徑；需要在有 OpenGL context 時使用
+
+    零件的網格、顏色、填充或可見性改變（Node.style_revision），或群組內非 root 成員的
+    變換改變（node.version，與 gl_backend.StaticGroup.key 相同）時才重建頂點緩衝區，
+    關節轉動只需要更新骨頭矩陣。draw_calls 為最近一幀送出的繪製指令數。
+    """
+    def __init__(self):
+        self.program = None
+        self.bone_count = 0
+        self.buffers = None
+        self.bones = None
+        self.draw_calls = 0
+        self.rebuilds = 0
+        self._key = None
+        self._structure = None
+        # 各群組除了 root 以外的成員，它們的變換已經預先乘進頂點
+        self._members = []
+
+    @staticmethod
+    def max_bones():
+        """頂點著色器 uniform 可以放下的 mat4 數（保留一些給其他 uniform）"""
+        return int(glGetIntegerv(GL_MAX_VERTEX_UNIFORM_COMPONENTS)) // 16 - 4
+
+    def _compile(self, bone_count):
+        if self.program is not None:
+            glDeleteProgram(self.program)
+        self.program = shaders.compileProgram(
+            shaders.compileShader(VERTEX_SHADER % max(bone_count, 1), GL_VERTEX_SHADER),
+            shaders.compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self.bone_count = bone_count
+        self.locations = {name: glGetUniformLocation(self.program, name) for name in ("bones", "line_color")}
+        self.attributes = {name: glGetAttribLocation(self.program, name) for name in ("position", "color", "bone")}
+
+    def _rebuild(self, kinematics):
+        vertices, triangles, edges, bones = merge_geometry(kinematics)
+        if len(bones) > self.max_bones():
+            # 骨頭太多放不進 uniform，由呼叫端改用固定管線
+            self.bones = None
+            return
+        if self.program is None or len(bones) > self.bone_count:
+            self._compile(len(bones))
+        if self.buffers is None:
+            self.buffers = glGenBuffers(3)
+        vertex_buffer, triangle_buffer, edge_buffer = self.buffers
+        glBindBuffer(GL_ARRAY_BUFFER, vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, triangle_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, triangles.nbytes, triangles, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, edge_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, edges.nbytes, edges, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.triangle_count = triangles.size
+        self.edge_count = edges.size
+        self.bones = bones
+        self.rebuilds += 1
+
+    def render(self, kinematics):
+        """相機矩陣須已經設定好（RobotView.apply_camera）；無法使用這個路徑時回傳 False"""
+        kinematics.update()
+        structure = (id(kinematics), kinematics.structure_version)
+        if structure != self._structure:
+            self._members = [i for members in rigid_groups(kinematics).values() for i in members[1:]]
+            self._structure = structure
+        nodes = kinematics.nodes
+        key = (structure, Node.style_revision, Node.wireframe_color,
+               tuple(node.visible for node in nodes), tuple(nodes[i].version for i in self._members))
+        if key != self._key:
+            self._rebuild(kinematics)
+            self._key = key
+        self.draw_calls = 0
+        if self.bones is None:
+            return False
+        if not self.bones.size:
+            return True
+
+        glUseProgram(self.program)
+        glUniformMatrix4fv(self.locations["bones"], len(self.bones), GL_FALSE, kinematics.gl_world[self.bones])
+        vertex_buffer, triangle_buffer, edge_buffer = self.buffers
+        glBindBuffer(GL_ARRAY_BUFFER, vertex_buffer)
+        stride = 7 * 4
+        for name, size, offset in (("position", 3, 0), ("color", 3, 12), ("bone", 1, 24)):
+            location = self.attributes[name]
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset))
+
+        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        if self.triangle_count:
+            glUniform4f(self.locations["line_color"], 0, 0, 0, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, triangle_buffer)
+            glDrawElements(GL_TRIANGLES, self.triangle_count, GL_UNSIGNED_INT, None)
+            self.draw_calls += 1
+        if self.edge_count:
+            glUniform4f(self.locations["line_color"], *Node.wireframe_color, 1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, edge_buffer)
+            glDrawElements(GL_LINES, self.edge_count, GL_UNSIGNED_INT, None)
+            self.draw_calls += 1
+
+        for location in self.attributes.values():
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+        return True
+
+    def delete(self):
+        if self.buffers is not None:
+            glDeleteBuffers(3, self.buffers)
+            self.buffers = None
+        if self.program is not None:
+            glDeleteProgram(self.program)
+            self.program = None
+        self._key = None
+        self._structure = None
+
+
+def main():
+    """離屏繪製同一組姿勢，比較兩條路徑的畫面差異、draw call 數與每幀時間"""
+    import time
+    import offscreen
+    from gl_stats import GLCallCounter
+    from robot import Robot
+
+    renderer = offscreen.OffscreenRenderer(512, 512)
+    view = renderer.view
+    view.view_rot_x, view.view_rot_y = 20, 30
+    robot = Robot(create_view=False)
+    draw_names = ("glDrawElements", "glDrawArrays", "gluSphere")
+
+    for fill in (True, False):
+        if robot.fill != fill:
+            robot.change_fill()
+        for steps in (0, 10):
+            for _ in range(steps):
+                robot.all_add_step()
+            results = {}
+            for skinning in (False, True):
+                view.skinning = skinning
+                view.display_lists = type(view.display_lists)()
+                # 第一幀編譯 display list / 建立頂點緩衝區，記錄固定管線實際送出的繪製指令
+                with GLCallCounter(("gl_backend", "RobotView", "skinning")) as counter:
+                    first = renderer.render(robot)
+                draws = sum(counter.counts[name] for name in draw_names)
+                calls = counter.counts["glCallList"]
+                pose = robot.snapshot()
+                start = time.perf_counter()
+                for i in range(50):
+                    # 每幀都轉動關節，固定管線不能只重播上一幀
+                    robot.root_joint.set_angle(robot.root_joint.angle + (1 if i % 2 else -1))
+                    renderer.render(robot)
+                glFinish()
+                elapsed = (time.perf_counter() - start) / 50
+                robot.restore(pose)
+                results[skinning] = first
+                label = "著色器" if skinning else "固定管線"
+                detail = f"{view.skinned.draw_calls} 次繪製" if skinning else f"{calls} 個 display list 內含 {draws} 次繪製"
+                print(f"{'實心' if fill else '線框'} step {steps:2d} {label}：{detail}，{elapsed * 1000:.2f} ms/幀")
+            diff = np.any(results[False] != results[True], axis=2)
+            print(f"  畫面差異 {diff.sum()} 像素（{diff.mean():.3%}）")
+
+
+if __name__ == '__main__':
+    main()